@@ -0,0 +1,267 @@
+# arrangement.py
+# version 0.1
+
+from collections import namedtuple
+
+import numpy as np
+
+import midi_writer
+from melody_engine import generate_rule_based_indices
+from scale_library import ScaleLibrary
+
+BEATS_PER_BAR = 4
+
+# chord roots as scale degrees (0 = tonic), one chord per bar: I - V - vi - IV
+DEFAULT_PROGRESSION = (0, 4, 5, 3)
+
+# bars per melody phrase; every phrase follows the contour from the middle tonic
+PHRASE_BARS = 4
+
+MELODY_PROGRAM = 73         # Flute
+CHORD_PROGRAM = 0           # Acoustic Grand Piano
+BASS_PROGRAM = 33           # Electric Bass (finger)
+
+# General MIDI percussion notes
+KICK = 36
+SNARE = 38
+CLOSED_HI_HAT = 42
+
+MELODY_VELOCITY = 100
+CHORD_VELOCITY = 70
+BASS_VELOCITY = 90
+
+# One part of an arrangement as parallel arrays, with times in beats
+Part = namedtuple("Part", ["name", "program", "is_drum", "pitches", "starts", "ends", "velocities"])
+
+
+def _degree_pitches(key_name, degrees, octave):
+    """
+    MIDI pitches of scale degrees counted from the tonic of the given octave.
+
+    Degrees past the top of the scale continue into the next octaves.
+
+    :param key_name: (str) Key name
+    :param degrees: (numpy.ndarray) Scale degrees (0 = tonic)
+    :param octave: (int) Octave of the tonic relative to the key's root note (0 = C4 octave)
+    :return: (numpy.ndarray) MIDI note numbers
+    """
+    root, mode = ScaleLibrary.parse_key_name(key_name)
+    steps = np.array(ScaleLibrary.MODE_STEPS[mode][:-1])
+    octaves, degree = np.divmod(degrees, len(steps))
+    return ScaleLibrary.ROOT_NOTES[root] + 12 * (octave + octaves) + steps[degree]
+
+
+def _bar_chords(progression, bars):
+    """
+    :return: (numpy.ndarray) Chord root degree of every bar
+    """
+    return np.resize(np.asarray(progression), bars)
+
+
+def melody_part(key_name, bars, contour="arch", program=MELODY_PROGRAM, rng=None):
+    """
+    Rule-based melody, one quarter note per beat, in phrases of PHRASE_BARS bars.
+
+    All phrases are generated together by melody_engine in one batch.
+
+    :param key_name: (str) Key name
+    :param bars: (int) Number of bars
+    :param contour: (str) 'arch', 'ascending', 'descending', or 'random'
+    :param program: (int) MIDI program number (instrument)
+    :param rng: (int or numpy.random.Generator) Seed or random generator
+    :return: (Part) The melody
+    """
+    key_scale = np.asarray(ScaleLibrary.scale(key_name))
+    phrase_length = PHRASE_BARS * BEATS_PER_BAR
+    phrases = -(-bars // PHRASE_BARS)
+
+    indices = generate_rule_based_indices(
+        phrases, len(key_scale), note_count=phrase_length, contour=contour, rng=rng
+    )
+    pitches = key_scale[indices.ravel()[:bars * BEATS_PER_BAR]]
+
+    starts = np.arange(len(pitches), dtype=np.float64)
+    return Part("Melody", program, False, pitches, starts, starts + 1.0,
+                np.full(len(pitches), MELODY_VELOCITY))
+
+
+def chord_part(key_name, bars, progression=DEFAULT_PROGRESSION, program=CHORD_PROGRAM):
+    """
+    Block triads held for a whole bar, built by stacking scale thirds.
+
+    :param key_name: (str) Key name
+    :param bars: (int) Number of bars
+    :param progression: (tuple) Chord root degrees, repeated over the bars
+    :param program: (int) MIDI program number (instrument)
+    :return: (Part) The chords
+    """
+    roots = _bar_chords(progression, bars)
+    degrees = roots[:, None] + np.array([0, 2, 4])
+    pitches = _degree_pitches(key_name, degrees, octave=-1).ravel()
+
+    starts = np.repeat(np.arange(bars, dtype=np.float64) * BEATS_PER_BAR, 3)
+    return Part("Chords", program, False, pitches, starts, starts + BEATS_PER_BAR,
+                np.full(len(pitches), CHORD_VELOCITY))
+
+
+def bass_part(key_name, bars, progression=DEFAULT_PROGRESSION, program=BASS_PROGRAM):
+    """
+    Half-note bass line: the chord root on beat 1 and its fifth on beat 3.
+
+    :param key_name: (str) Key name
+    :param bars: (int) Number of bars
+    :param progression: (tuple) Chord root degrees, repeated over the bars
+    :param program: (int) MIDI program number (instrument)
+    :return: (Part) The bass line
+    """
+    roots = _bar_chords(progression, bars)
+    degrees = roots[:, None] + np.array([0, 4])
+    pitches = _degree_pitches(key_name, degrees, octave=-2).ravel()
+
+    starts = np.arange(2 * bars, dtype=np.float64) * (BEATS_PER_BAR / 2)
+    return Part("Bass", program, False, pitches, starts, starts + BEATS_PER_BAR / 2,
+                np.full(len(pitches), BASS_VELOCITY))
+
+
+def drum_part(bars):
+    """
+    Rock beat: kick on 1 and 3, snare on 2 and 4, closed hi-hat on every eighth.
+
+    :param bars: (int) Number of bars
+    :return: (Part) The drums
+    """
+    # one bar of (beat, drum, velocity), tiled over every bar
+    eighths = np.arange(2 * BEATS_PER_BAR) / 2
+    pattern_beats = np.concatenate([eighths, [0.0, 2.0], [1.0, 3.0]])
+    pattern_drums = np.concatenate([
+        np.full(len(eighths), CLOSED_HI_HAT), [KICK, KICK], [SNARE, SNARE]
+    ])
+    pattern_velocities = np.concatenate([np.tile([80, 60], BEATS_PER_BAR), [110, 100], [105, 105]])
+
+    order = np.argsort(pattern_beats, kind="stable")
+    bar_starts = np.arange(bars, dtype=np.float64)[:, None] * BEATS_PER_BAR
+    starts = (bar_starts + pattern_beats[order]).ravel()
+    pitches = np.tile(pattern_drums[order], bars)
+    velocities = np.tile(pattern_velocities[order], bars)
+    return Part("Drums", 0, True, pitches, starts, starts + 0.25, velocities)
+
+
+def arrange(
+        key_name="C Major",
+        bars=16,
+        progression=DEFAULT_PROGRESSION,
+        contour="arch",
+        melody_program=MELODY_PROGRAM,
+        chord_program=CHORD_PROGRAM,
+        bass_program=BASS_PROGRAM,
+        rng=None
+):
+    """
+    Compose melody, chords, bass and drums on one shared beat timeline.
+
+    :param key_name: (str) Key name
+    :param bars: (int) Number of 4/4 bars
+    :param progression: (tuple) Chord root degrees, one per bar, repeated
+    :param contour: (str) Melody contour per phrase
+    :param melody_program: (int) MIDI program of the melody
+    :param chord_program: (int) MIDI program of the chords
+    :param bass_program: (int) MIDI program of the bass
+    :param rng: (int or numpy.random.Generator) Seed or random generator for the melody
+    :return: (list) Parts in track order
+    """
+    return [
+        melody_part(key_name, bars, contour, melody_program, rng),
+        chord_part(key_name, bars, progression, chord_program),
+        bass_part(key_name, bars, progression, bass_program),
+        drum_part(bars),
+    ]
+
+
+def bars_for_duration(seconds, tempo=120):
+    """
+    :param seconds: (float) Length of the piece
+    :param tempo: (int) Tempo in BPM
+    :return: (int) Number of whole bars that covers seconds
+    """
+    return int(np.ceil(seconds * tempo / 60 / BEATS_PER_BAR))
+
+
+def part_notes(part, tempo=120):
+    """
+    Notes of a part in seconds, ordered by start.
+
+    :param part: (Part) Part with times in beats
+    :param tempo: (int) Tempo in BPM
+    :return: (list) (pitch, start, end, velocity) tuples
+    """
+    seconds_per_beat = 60 / tempo
+    order = np.argsort(part.starts, kind="stable")
+    return list(zip(
+        part.pitches[order].tolist(),
+        (part.starts[order] * seconds_per_beat).tolist(),
+        (part.ends[order] * seconds_per_beat).tolist(),
+        part.velocities[order].tolist(),
+    ))
+
+
+def part_ticks(part, resolution=midi_writer.DEFAULT_RESOLUTION):
+    """
+    Notes of a part in absolute ticks, ordered by start.
+
+    :param part: (Part) Part with times in beats
+    :param resolution: (int) Ticks per quarter note
+    :return: (list) (pitch, start, end, velocity) tuples
+    """
+    order = np.argsort(part.starts, kind="stable")
+    return list(zip(
+        part.pitches[order].tolist(),
+        np.rint(part.starts[order] * resolution).astype(np.int64).tolist(),
+        np.rint(part.ends[order] * resolution).astype(np.int64).tolist(),
+        part.velocities[order].tolist(),
+    ))
+
+
+def encode_arrangement(parts, tempo=120, resolution=midi_writer.DEFAULT_RESOLUTION):
+    """
+    :param parts: (list) Parts from arrange()
+    :param tempo: (int) Tempo in BPM
+    :param resolution: (int) Ticks per quarter note
+    :return: (bytes) One MIDI file with a track per part
+    """
+    return midi_writer.encode_tracks(
+        [midi_writer.Track(part_ticks(part, resolution), part.program, part.is_drum, part.name)
+         for part in parts],
+        tempo,
+        resolution,
+        ticks=True,
+    )
+
+
+def generate_arrangement(
+        filename="arrangement.mid",
+        key_name="C Major",
+        tempo=120,
+        bars=16,
+        progression=DEFAULT_PROGRESSION,
+        contour="arch",
+        return_bytes=False,
+        rng=None
+):
+    """
+    Generate a four-track arrangement and save it to a MIDI file.
+
+    :param filename: (str or binary stream) Output MIDI filename or writable stream
+    :param key_name: (str) Key name
+    :param tempo: (int) Tempo in BPM
+    :param bars: (int) Number of 4/4 bars
+    :param progression: (tuple) Chord root degrees, one per bar, repeated
+    :param contour: (str) Melody contour per phrase
+    :param return_bytes: (bool) Return the MIDI bytes instead of writing a file
+    :param rng: (int or numpy.random.Generator) Seed or random generator for the melody
+    :return: filename, or (bytes) MIDI data if return_bytes
+    """
+    parts = arrange(key_name, bars, progression, contour, rng=rng)
+    data = encode_arrangement(parts, tempo)
+    if return_bytes:
+        return data
+    return midi_writer.write_bytes(filename, data)
@@ -0,0 +1,588 @@
+# audio_renderer.py
+# version 0.1
+#
+# Offline, CPU-only synthesizer that turns generated notes into PCM audio.
+# Each instrument is a single-cycle wavetable built from a few harmonics, shaped
+# by an ADSR envelope. Notes are rendered in batches of array operations.
+
+import os
+import threading
+import wave
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from note_buffer import NoteBuffer
+
+SAMPLE_RATE = 44100
+
+# Samples per wavetable cycle
+TABLE_SIZE = 2048
+
+# Overall output level per note at velocity 127, so a few overlapping notes
+# stay below full scale
+MASTER_GAIN = 0.3
+
+# Upper bound on (notes x samples) rendered in one array batch
+MAX_BATCH_SAMPLES = 1 << 22
+
+# Memory cap of the shared note waveform cache
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# Samples per block when streaming (about 0.37 s at 44.1 kHz)
+DEFAULT_BLOCK_SIZE = 16384
+
+# harmonics: relative amplitude of partials 1, 2, 3, ...
+# attack, decay, release: seconds; sustain: level between 0 and 1
+Timbre = namedtuple("Timbre", ["harmonics", "attack", "decay", "sustain", "release"])
+
+# Keyed by the MIDI program numbers in music_generator.INSTRUMENTS
+INSTRUMENT_TIMBRES = {
+    0: Timbre((1.0, 0.5, 0.25, 0.12, 0.06, 0.03), 0.005, 0.4, 0.3, 0.25),     # Acoustic Grand Piano
+    27: Timbre((1.0, 0.45, 0.3, 0.15, 0.1, 0.05), 0.002, 0.5, 0.2, 0.2),      # Electric Guitar (clean)
+    40: Timbre((1.0, 0.6, 0.45, 0.35, 0.25, 0.15, 0.1), 0.08, 0.1, 0.85, 0.2),  # Violin
+    56: Timbre((1.0, 0.8, 0.65, 0.5, 0.35, 0.25, 0.15), 0.03, 0.08, 0.8, 0.1),  # Trumpet
+    73: Timbre((1.0, 0.25, 0.08, 0.03), 0.06, 0.05, 0.9, 0.15),               # Flute
+}
+
+DEFAULT_PROGRAM = 0
+
+
+def timbre_for_program(instrument_program):
+    """
+    Timbre used for a MIDI program (falls back to the piano timbre).
+
+    :param instrument_program: (int) MIDI program number (instrument)
+    :return: (Timbre)
+    """
+    return INSTRUMENT_TIMBRES.get(instrument_program, INSTRUMENT_TIMBRES[DEFAULT_PROGRAM])
+
+
+@lru_cache(maxsize=None)
+def _wavetable(harmonics):
+    """
+    One normalized cycle of the additive waveform, with a wrap-around sample
+    so linear interpolation never indexes past the end.
+    """
+    phase = np.arange(TABLE_SIZE + 1) / TABLE_SIZE
+    table = np.zeros(TABLE_SIZE + 1)
+    for partial, amplitude in enumerate(harmonics, start=1):
+        table += amplitude * np.sin(2 * np.pi * partial * phase)
+    table /= np.abs(table).max()
+    return table
+
+
+def pitch_to_frequency(pitch):
+    """
+    :param pitch: (int or numpy.ndarray) MIDI note number(s)
+    :return: Frequency in Hz
+    """
+    return 440.0 * 2.0 ** ((np.asarray(pitch, dtype=np.float64) - 69) / 12)
+
+
+def _envelope(t, durations, timbre):
+    """
+    ADSR envelope for a matrix of note-local times.
+
+    :param t: (numpy.ndarray) Seconds since each note started, shape (notes, samples)
+    :param durations: (numpy.ndarray) Held length of each note in seconds, shape (notes, 1)
+    :param timbre: (Timbre)
+    :return: (numpy.ndarray) Envelope level, same shape as t
+    """
+    attack, decay, sustain, release = timbre.attack, timbre.decay, timbre.sustain, timbre.release
+
+    def held_level(time):
+        decaying = 1.0 - (1.0 - sustain) * (time - attack) / decay
+        return np.where(
+            time < attack,
+            time / attack,
+            np.where(time < attack + decay, decaying, sustain),
+        )
+
+    released = held_level(durations) * (1.0 - (t - durations) / release)
+    level = np.where(t < durations, held_level(t), released)
+    level[(t < 0) | (t >= durations + release)] = 0.0
+    return np.clip(level, 0.0, 1.0)
+
+
+def render_note_matrix(pitches, velocities, durations, offsets, length, timbre, sample_rate=SAMPLE_RATE):
+    """
+    Render many notes at once, one row per note.
+
+    Row i holds samples offsets[i] .. offsets[i] + length - 1 of note i, counted
+    from the note's start; samples outside the note (before it starts or after
+    its release) are zero.
+
+    :param pitches: (numpy.ndarray) MIDI note numbers
+    :param velocities: (numpy.ndarray) MIDI velocities
+    :param durations: (numpy.ndarray) Held length of each note in seconds
+    :param offsets: (numpy.ndarray) First note-local sample of each row
+    :param length: (int) Samples per row
+    :param timbre: (Timbre)
+    :param sample_rate: (int) Samples per second
+    :return: (numpy.ndarray) float32 array of shape (notes, length)
+    """
+    samples = np.asarray(offsets, dtype=np.int64)[:, None] + np.arange(length)[None, :]
+    t = samples / sample_rate
+
+    # wavetable lookup with linear interpolation
+    cycles = pitch_to_frequency(pitches)[:, None] * t
+    position = (cycles % 1.0) * TABLE_SIZE
+    index = position.astype(np.int64)
+    fraction = position - index
+    table = _wavetable(timbre.harmonics)
+    wave_values = table[index] * (1.0 - fraction) + table[index + 1] * fraction
+
+    gain = MASTER_GAIN * np.asarray(velocities, dtype=np.float64)[:, None] / 127
+    envelope = _envelope(t, np.asarray(durations, dtype=np.float64)[:, None], timbre)
+
+    return (wave_values * envelope * gain).astype(np.float32)
+
+
+class WaveformCache:
+    """
+    Size-bounded LRU cache of rendered note waveforms.
+
+    Keys are (timbre, sample_rate, pitch, velocity, held samples); values are
+    read-only float32 arrays holding the whole note including its release.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            waveform = self._entries.get(key)
+            if waveform is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return waveform
+
+    def put(self, key, waveform):
+        if waveform.nbytes > self.max_bytes:
+            return
+        waveform.flags.writeable = False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous.nbytes
+            self._entries[key] = waveform
+            self.current_bytes += waveform.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        :return: (dict) hits, misses, hit_rate, entries and bytes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+            }
+
+
+# Shared by every render in this process (each worker process has its own)
+NOTE_CACHE = WaveformCache()
+
+
+def _note_arrays(notes):
+    """
+    Split (pitch, start, end, velocity) notes into arrays.
+    """
+    if isinstance(notes, NoteBuffer):
+        if notes.resolution is not None:
+            raise ValueError("Notes are in ticks; convert them with NoteBuffer.to_seconds(tempo) first")
+        pitches, starts, ends, velocities = (np.asarray(column) for column in notes.columns())
+        return pitches.astype(np.int64), starts, ends, velocities.astype(np.int64)
+    notes = list(notes)
+    if not notes:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, np.zeros(0), np.zeros(0), empty
+    pitches, starts, ends, velocities = (np.asarray(column) for column in zip(*notes))
+    return pitches, starts.astype(np.float64), ends.astype(np.float64), velocities
+
+
+def _sample_layout(notes, instrument_program, sample_rate):
+    """
+    Note arrays with start, held length and sounding length (held + release)
+    in samples. Held lengths are whole samples so equal notes share a cached
+    waveform wherever they start.
+
+    :return: (tuple) timbre, pitches, velocities, held_samples, start_samples, note_lengths
+    """
+    timbre = timbre_for_program(instrument_program)
+    pitches, starts, ends, velocities = _note_arrays(notes)
+    start_samples = np.round(starts * sample_rate).astype(np.int64)
+    held_samples = np.round((ends - starts) * sample_rate).astype(np.int64)
+    note_lengths = held_samples + int(np.ceil(timbre.release * sample_rate))
+    return timbre, pitches, velocities, held_samples, start_samples, note_lengths
+
+
+def _note_waveforms(timbre, pitches, velocities, held_samples, sample_rate, cache=NOTE_CACHE):
+    """
+    Whole waveform of every note, rendering each distinct note only once.
+
+    Notes missing from the cache are rendered together in batches of array
+    operations.
+
+    :return: (list) float32 arrays, one per note
+    """
+    release_samples = int(np.ceil(timbre.release * sample_rate))
+    keys = list(zip(pitches.tolist(), velocities.tolist(), held_samples.tolist()))
+
+    waveforms = {}
+    missing = []
+    for key in sorted(set(keys)):
+        waveform = cache.get((timbre, sample_rate) + key) if cache is not None else None
+        if waveform is None:
+            missing.append(key)
+        else:
+            waveforms[key] = waveform
+
+    if missing:
+        missing_pitches, missing_velocities, missing_held = (np.array(column) for column in zip(*missing))
+        lengths = missing_held + release_samples
+
+        # render as many notes per batch as fit in MAX_BATCH_SAMPLES
+        batch_size = max(1, MAX_BATCH_SAMPLES // int(lengths.max()))
+        for first in range(0, len(missing), batch_size):
+            batch = slice(first, first + batch_size)
+            rows = render_note_matrix(
+                missing_pitches[batch],
+                missing_velocities[batch],
+                missing_held[batch] / sample_rate,
+                np.zeros(len(lengths[batch]), dtype=np.int64),
+                int(lengths[batch].max()),
+                timbre,
+                sample_rate,
+            )
+            for key, row, length in zip(missing[batch], rows, lengths[batch]):
+                waveform = row[:length].copy()
+                if cache is not None:
+                    cache.put((timbre, sample_rate) + key, waveform)
+                waveforms[key] = waveform
+
+    return [waveforms[key] for key in keys]
+
+
+def render_notes(notes, instrument_program=0, sample_rate=SAMPLE_RATE, cache=NOTE_CACHE):
+    """
+    Render notes (as yielded by the music_generator iter_* functions) to audio.
+
+    :param notes: Iterable of (pitch, start, end, velocity) with times in seconds
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param sample_rate: (int) Samples per second
+    :param cache: (WaveformCache) Note waveform cache, or None to always render
+    :return: (numpy.ndarray) float32 mono samples
+    """
+    timbre, pitches, velocities, held_samples, start_samples, note_lengths = _sample_layout(
+        notes, instrument_program, sample_rate
+    )
+    if len(pitches) == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    audio = np.zeros(int((start_samples + note_lengths).max()), dtype=np.float32)
+
+    waveforms = _note_waveforms(timbre, pitches, velocities, held_samples, sample_rate, cache)
+    for waveform, start in zip(waveforms, start_samples):
+        audio[start:start + len(waveform)] += waveform
+
+    return audio
+
+
+def mix_tracks(tracks, sample_rate=SAMPLE_RATE, cache=NOTE_CACHE):
+    """
+    Render several instruments and add them together, in track order.
+
+    :param tracks: (list) (instrument_program, notes) pairs
+    :param sample_rate: (int) Samples per second
+    :param cache: (WaveformCache) Note waveform cache, or None to always render
+    :return: (numpy.ndarray) float32 mono samples
+    """
+    rendered = [render_notes(notes, program, sample_rate, cache) for program, notes in tracks]
+
+    audio = np.zeros(max((len(track) for track in rendered), default=0), dtype=np.float32)
+    for track in rendered:
+        audio[:len(track)] += track
+    return audio
+
+
+def _render_segment(shm_name, total_length, segment_start, segment_end, layouts, sample_rate):
+    """
+    Worker: render samples segment_start..segment_end of every track into the
+    shared output buffer.
+
+    Notes that started before the segment are included, so their tails and
+    releases carry over the boundary. Every sample gets its note and track
+    contributions added in the same order as render_notes / mix_tracks, so
+    the result is identical to a single-process render.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        audio = np.ndarray((total_length,), dtype=np.float32, buffer=shm.buf)
+
+        for timbre, pitches, velocities, held_samples, start_samples, note_lengths in layouts:
+            track = np.zeros(segment_end - segment_start, dtype=np.float32)
+            waveforms = _note_waveforms(timbre, pitches, velocities, held_samples, sample_rate)
+            for waveform, start in zip(waveforms, start_samples):
+                low = max(start, segment_start)
+                high = min(start + len(waveform), segment_end)
+                track[low - segment_start:high - segment_start] += waveform[low - start:high - start]
+
+            audio[segment_start:segment_end] += track
+
+        del audio
+    finally:
+        shm.close()
+
+
+def render_tracks_parallel(tracks, sample_rate=SAMPLE_RATE, workers=None, segment_seconds=None):
+    """
+    Render and mix instruments on a process pool, sample-identical to mix_tracks.
+
+    The timeline is cut into segments, one task each. A segment also renders
+    the tails of notes that started before it, so no note is cut at a
+    boundary. Workers add their segment straight into a shared-memory output
+    buffer, so no audio is pickled back to the parent. Each worker uses its
+    own NOTE_CACHE.
+
+    :param tracks: (list) (instrument_program, notes) pairs
+    :param sample_rate: (int) Samples per second
+    :param workers: (int) Number of worker processes (default: CPU count)
+    :param segment_seconds: (float) Segment length (default: ~4 segments per worker)
+    :return: (numpy.ndarray) float32 mono samples
+    """
+    layouts = [_sample_layout(notes, program, sample_rate) for program, notes in tracks]
+    layouts = [layout for layout in layouts if len(layout[1])]
+
+    total_length = max((int((layout[4] + layout[5]).max()) for layout in layouts), default=0)
+    if total_length == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if segment_seconds is None:
+        segment_length = -(-total_length // (workers * 4))
+    else:
+        segment_length = int(segment_seconds * sample_rate)
+    segment_length = max(segment_length, DEFAULT_BLOCK_SIZE)
+
+    shm = shared_memory.SharedMemory(create=True, size=total_length * np.dtype(np.float32).itemsize)
+    try:
+        audio = np.ndarray((total_length,), dtype=np.float32, buffer=shm.buf)
+        audio[:] = 0.0
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for segment_start in range(0, total_length, segment_length):
+                segment_end = min(segment_start + segment_length, total_length)
+                # only send the notes that sound in this segment
+                segment_layouts = []
+                for timbre, pitches, velocities, held_samples, start_samples, note_lengths in layouts:
+                    sounding = ((start_samples < segment_end)
+                                & (start_samples + note_lengths > segment_start))
+                    segment_layouts.append((
+                        timbre, pitches[sounding], velocities[sounding], held_samples[sounding],
+                        start_samples[sounding], note_lengths[sounding],
+                    ))
+                futures.append(executor.submit(
+                    _render_segment, shm.name, total_length, segment_start, segment_end,
+                    segment_layouts, sample_rate,
+                ))
+            for future in futures:
+                future.result()
+
+        result = audio.copy()
+        del audio
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return result
+
+
+def to_pcm16(audio):
+    """
+    :param audio: (numpy.ndarray) Float samples in [-1, 1]
+    :return: (bytes) Little-endian 16-bit PCM
+    """
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def write_wav(filename, audio, sample_rate=SAMPLE_RATE):
+    """
+    Save float samples in [-1, 1] as a 16-bit mono WAV file.
+
+    :param filename: (str or binary stream) Output WAV filename or writable stream
+    :param audio: (numpy.ndarray) Samples
+    :param sample_rate: (int) Samples per second
+    :return: filename
+    """
+    with wave.open(filename, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(to_pcm16(audio))
+    return filename
+
+
+def render_to_wav(filename, notes, instrument_program=0, sample_rate=SAMPLE_RATE):
+    """
+    Render notes and save them as a WAV file.
+
+    :param filename: (str or binary stream) Output WAV filename or writable stream
+    :param notes: Iterable of (pitch, start, end, velocity) with times in seconds
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param sample_rate: (int) Samples per second
+    :return: filename
+    """
+    return write_wav(filename, render_notes(notes, instrument_program, sample_rate), sample_rate)
+
+
+def iter_audio_blocks(notes, instrument_program=0, sample_rate=SAMPLE_RATE, block_size=DEFAULT_BLOCK_SIZE,
+                      cache=NOTE_CACHE):
+    """
+    Render a note stream in fixed-size blocks of samples.
+
+    Notes are pulled lazily and must be ordered by start time (as the
+    music_generator iter_* functions yield them). Only the notes sounding in
+    the current block are kept, so memory depends on the block size and the
+    number of overlapping notes, not on the length of the piece.
+
+    :param notes: Iterable of (pitch, start, end, velocity) with times in seconds
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param sample_rate: (int) Samples per second
+    :param block_size: (int) Samples per block
+    :param cache: (WaveformCache) Note waveform cache, or None to always render
+    :return: generator of float32 arrays of block_size samples (the last one may be shorter)
+    """
+    notes = iter(notes)
+
+    # sounding notes as (start sample, waveform)
+    active = []
+    next_note = next(notes, None)
+    last_start = 0
+    block_start = 0
+
+    while active or next_note is not None:
+        block_end = block_start + block_size
+
+        arriving = []
+        while next_note is not None:
+            start_sample = int(round(next_note[1] * sample_rate))
+            if start_sample >= block_end:
+                break
+            if start_sample < last_start:
+                raise ValueError("Notes must be ordered by start time")
+            last_start = start_sample
+            arriving.append(next_note)
+            next_note = next(notes, None)
+
+        if arriving:
+            timbre, pitches, velocities, held_samples, start_samples, _ = _sample_layout(
+                arriving, instrument_program, sample_rate
+            )
+            waveforms = _note_waveforms(timbre, pitches, velocities, held_samples, sample_rate, cache)
+            active.extend(zip(start_samples.tolist(), waveforms))
+
+        block = np.zeros(block_size, dtype=np.float32)
+        for start, waveform in active:
+            low = max(start, block_start)
+            high = min(start + len(waveform), block_end)
+            block[low - block_start:high - block_start] += waveform[low - start:high - start]
+
+        last_sample = max((start + len(waveform) for start, waveform in active), default=block_start)
+        active = [(start, waveform) for start, waveform in active if start + len(waveform) > block_end]
+
+        if next_note is None and not active:
+            # last block: stop where the final release ends
+            yield block[:last_sample - block_start]
+            return
+
+        yield block
+        block_start = block_end
+
+
+def render_stream_to_wav(filename, notes, instrument_program=0, sample_rate=SAMPLE_RATE,
+                         block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Render a note stream block by block straight into a WAV file.
+
+    Peak memory is set by block_size, not by the length of the piece. Stop an
+    unbounded stream with itertools.islice.
+
+    :param filename: (str or seekable binary stream) Output WAV filename or stream
+    :param notes: Iterable of (pitch, start, end, velocity) ordered by start time
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param sample_rate: (int) Samples per second
+    :param block_size: (int) Samples per block
+    :return: filename
+    """
+    with wave.open(filename, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for block in iter_audio_blocks(notes, instrument_program, sample_rate, block_size):
+            wav.writeframes(to_pcm16(block))
+    return filename
+
+
+def render_midi_file(midi_filename, wav_filename, sample_rate=SAMPLE_RATE, workers=1):
+    """
+    Render every melodic instrument of a MIDI file to a WAV file.
+
+    Drum tracks are skipped; this synthesizer only has pitched timbres.
+
+    :param midi_filename: (str) Input MIDI filename
+    :param wav_filename: (str) Output WAV filename
+    :param sample_rate: (int) Samples per second
+    :param workers: (int) Worker processes; more than 1 renders with render_tracks_parallel
+    :return: wav_filename
+    """
+    # pretty_midi is only needed to read MIDI files
+    import pretty_midi
+
+    pm = pretty_midi.PrettyMIDI(midi_filename)
+    tracks = []
+    for instrument in pm.instruments:
+        if instrument.is_drum or not instrument.notes:
+            continue
+        notes = sorted(
+            ((n.pitch, n.start, n.end, n.velocity) for n in instrument.notes),
+            key=lambda note: note[1],
+        )
+        tracks.append((instrument.program, notes))
+
+    if workers == 1:
+        audio = mix_tracks(tracks, sample_rate)
+    else:
+        audio = render_tracks_parallel(tracks, sample_rate, workers)
+
+    return write_wav(wav_filename, audio, sample_rate)
@@ -0,0 +1,237 @@
+# benchmark.py
+# version 0.1
+#
+# Times the generators phase by phase (composition, MIDI serialization, file
+# write), saves the results as JSON and compares them against a baseline.
+#
+#   python benchmark.py --save-baseline      record a baseline on this machine
+#   python benchmark.py                      run and fail on regressions
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import midi_writer
+import music_generator
+from note_buffer import NoteBuffer
+from scale_library import ScaleLibrary
+
+NOTE_COUNTS = [16, 256, 4096, 65536, 1000000]
+
+DEFAULT_RESULTS = "benchmark_results.json"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+# a phase fails when its median is this much slower than the baseline's...
+DEFAULT_THRESHOLD = 0.25
+# ...plus a noise allowance of this many times the two runs' spreads (the
+# interquartile range of the timings), and at least this many seconds
+SPREAD_FACTOR = 3
+MIN_REGRESSION_SECONDS = 0.001
+
+# every phase runs at least MIN_REPEATS times, and more while it has taken
+# less than MIN_PHASE_SECONDS, up to MAX_REPEATS
+MIN_REPEATS = 5
+MAX_REPEATS = 200
+MIN_PHASE_SECONDS = 0.5
+
+SEED = 1234
+
+
+def _timed(function):
+    """
+    Run function repeatedly (see MIN_REPEATS) and return (median seconds,
+    spread in seconds, last result).
+    """
+    timings = []
+    result = None
+    total = 0.0
+    while len(timings) < MIN_REPEATS or (total < MIN_PHASE_SECONDS and len(timings) < MAX_REPEATS):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+
+    timings.sort()
+    n = len(timings)
+    median = (timings[(n - 1) // 2] + timings[n // 2]) / 2
+    spread = timings[(3 * n) // 4] - timings[n // 4]
+    return median, spread, result
+
+
+def _note_streams():
+    """
+    Composition step of each generator, as functions of note_count.
+    """
+    key_scale = ScaleLibrary.scale("C Major")
+    scale_length = len(key_scale)
+
+    def tick_buffer(events):
+        return NoteBuffer.from_notes(
+            music_generator.tick_notes(key_scale, events), resolution=music_generator.TICKS_PER_BEAT
+        )
+
+    return {
+        "generate_scale": lambda count: tick_buffer(itertools.islice(
+            music_generator.iter_scale_indices(scale_length, repeat=True), count)),
+        "generate_random_melody": lambda count: tick_buffer(
+            music_generator.iter_random_indices(scale_length, count, rng=SEED)),
+        "generate_melody_rule_based": lambda count: tick_buffer(
+            music_generator.iter_rule_based_indices(scale_length, count, rng=SEED)),
+    }
+
+
+def benchmark_generator(compose, note_count, path):
+    """
+    Time composition, serialization and file write for one generator run.
+
+    :param compose: Function returning the NoteBuffer of notes for note_count
+    :param note_count: (int) Number of notes to generate
+    :param path: (str) Scratch file for the write phase
+    :return: (tuple) (median seconds per phase, spread seconds per phase)
+    """
+    compose_time, compose_spread, notes = _timed(lambda: compose(note_count))
+    serialize_time, serialize_spread, data = _timed(
+        lambda: midi_writer.encode_midi(notes, resolution=notes.resolution, ticks=True)
+    )
+    write_time, write_spread, _ = _timed(lambda: midi_writer.write_bytes(path, data))
+
+    return (
+        {"compose": compose_time, "serialize": serialize_time, "write": write_time},
+        {"compose": compose_spread, "serialize": serialize_spread, "write": write_spread},
+    )
+
+
+def benchmark_scale_library():
+    """
+    Time ScaleLibrary.major_scales on an empty cache and on a warm cache.
+
+    :return: (tuple) (median seconds per case, spread seconds per case)
+    """
+    def cold():
+        ScaleLibrary._scale_cache.clear()
+        ScaleLibrary._major_scales_cache.clear()
+        return ScaleLibrary.major_scales()
+
+    cold_time, cold_spread, _ = _timed(cold)
+    warm_time, warm_spread, _ = _timed(ScaleLibrary.major_scales)
+    return {"cold": cold_time, "warm": warm_time}, {"cold": cold_spread, "warm": warm_spread}
+
+
+def run_benchmarks(note_counts):
+    """
+    Run every benchmark.
+
+    :param note_counts: (list) Note counts to benchmark the generators at
+    :return: (tuple) (median results, spreads), both keyed by "function/note_count"
+    """
+    results = {}
+    spreads = {}
+
+    fd, path = tempfile.mkstemp(suffix=".mid")
+    os.close(fd)
+    try:
+        for name, compose in _note_streams().items():
+            for note_count in note_counts:
+                label = f"{name}/{note_count}"
+                results[label], spreads[label] = benchmark_generator(compose, note_count, path)
+                print(_format_row(label, results[label]))
+    finally:
+        os.remove(path)
+
+    label = "ScaleLibrary.major_scales"
+    results[label], spreads[label] = benchmark_scale_library()
+    print(_format_row(label, results[label]))
+
+    return results, spreads
+
+
+def _format_row(label, phases):
+    timings = "  ".join(f"{phase}={seconds * 1000:.3f}ms" for phase, seconds in phases.items())
+    return f"{label:40} {timings}"
+
+
+def compare(results, baseline, threshold, spreads=None, baseline_spreads=None):
+    """
+    Find phases whose median got slower than the baseline by more than the
+    threshold plus a noise allowance from both runs' spreads.
+
+    :param results: (dict) Current median results
+    :param baseline: (dict) Baseline median results
+    :param threshold: (float) Allowed slowdown (0.25 = 25%)
+    :param spreads: (dict) Current spreads (default: none)
+    :param baseline_spreads: (dict) Baseline spreads (default: none)
+    :return: (list) Messages describing each regression
+    """
+    spreads = spreads or {}
+    baseline_spreads = baseline_spreads or {}
+
+    regressions = []
+    for label, phases in results.items():
+        for phase, seconds in phases.items():
+            reference = baseline.get(label, {}).get(phase)
+            if reference is None:
+                continue
+            noise = SPREAD_FACTOR * (spreads.get(label, {}).get(phase, 0.0)
+                                     + baseline_spreads.get(label, {}).get(phase, 0.0))
+            if seconds - reference > reference * threshold + max(noise, MIN_REGRESSION_SECONDS):
+                regressions.append(
+                    f"{label} {phase}: {seconds * 1000:.3f}ms vs baseline "
+                    f"{reference * 1000:.3f}ms (+{(seconds / reference - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the music generators.")
+    parser.add_argument("--output", default=DEFAULT_RESULTS, help="where to store the results JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--max-notes", type=int, default=NOTE_COUNTS[-1],
+                        help="skip note counts above this")
+    args = parser.parse_args()
+
+    note_counts = [count for count in NOTE_COUNTS if count <= args.max_notes]
+    results, spreads = run_benchmarks(note_counts)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+        "spreads": spreads,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved as: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved as: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline["results"], args.threshold, spreads, baseline.get("spreads"))
+    if regressions:
+        print("Performance regressions:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
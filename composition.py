@@ -0,0 +1,224 @@
+# composition.py
+# version 0.1
+
+from functools import lru_cache
+
+import numpy as np
+
+import audio_renderer
+import midi_writer
+import music_generator
+from note_buffer import NoteBuffer
+from scale_library import ScaleLibrary
+
+# number of seeded compositions kept by compose
+COMPOSITION_CACHE_SIZE = 64
+
+
+class Composition:
+    """
+    A melody as scale indices and note lengths in beats, independent of key,
+    tempo, instrument and output format.
+
+    Composing is the expensive, random part of generation; rendering maps the
+    indices through a key's scale table and the beats through the tempo with
+    a few array operations, so the same melody in all 12 keys costs one
+    composition plus 12 renders. Renders to MIDI stay on the integer tick
+    timeline; seconds are only computed for audio and render(). Compositions
+    are immutable and may be shared.
+    """
+
+    def __init__(self, indices, beats, scale_length):
+        """
+        :param indices: (array-like) Scale index of every note
+        :param beats: (array-like) Length of every note in beats
+        :param scale_length: (int) Length of the scale tables the indices refer to
+        """
+        self.indices = np.array(indices, dtype=np.int16)
+        self.beats = np.array(beats, dtype=np.float64)
+        if self.indices.shape != self.beats.shape or self.indices.ndim != 1:
+            raise ValueError("indices and beats must be one-dimensional and of equal length")
+        if len(self.indices) and not 0 <= self.indices.min() <= self.indices.max() < scale_length:
+            raise ValueError(f"Scale index out of range for a scale of {scale_length} notes")
+        self.indices.flags.writeable = False
+        self.beats.flags.writeable = False
+        self.scale_length = scale_length
+
+    @classmethod
+    def from_events(cls, events, scale_length):
+        """
+        :param events: Iterable of (scale index, beats), e.g. from music_generator.iter_scale_indices
+        :param scale_length: (int) Length of the scale tables the indices refer to
+        :return: (Composition) The composition
+        """
+        indices = []
+        beats = []
+        for index, length in events:
+            indices.append(index)
+            beats.append(length)
+        return cls(indices, beats, scale_length)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def fits(self, key_name):
+        """
+        :param key_name: (str) Key name
+        :return: (bool) True when the composition can be rendered in the key
+        """
+        return len(ScaleLibrary.scale(key_name)) == self.scale_length
+
+    def pitches(self, key_name):
+        """
+        :param key_name: (str) Key name
+        :return: (numpy.ndarray) MIDI pitch of every note
+        """
+        key_scale = np.asarray(ScaleLibrary.scale(key_name), dtype=np.uint8)
+        if len(key_scale) != self.scale_length:
+            raise ValueError(
+                f"{key_name} has {len(key_scale)} scale notes, the composition needs {self.scale_length}"
+            )
+        return key_scale[self.indices]
+
+    def ticks(self, note_length_fraction=1.0, resolution=music_generator.TICKS_PER_BEAT):
+        """
+        Start and end of every note in absolute ticks.
+
+        Notes follow each other without gaps; beat positions are rounded to
+        ticks one by one, like music_generator.tick_notes.
+
+        :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+        :param resolution: (int) Ticks per quarter note
+        :return: (tuple) int64 numpy arrays (starts, ends)
+        """
+        ticks_per_beat = music_generator.beat_ticks(note_length_fraction, resolution)
+        ends = np.rint(np.cumsum(self.beats) * ticks_per_beat).astype(np.int64)
+        starts = np.zeros(len(ends), dtype=np.int64)
+        starts[1:] = ends[:-1]
+        return starts, ends
+
+    def timing(self, tempo=120, note_length_fraction=1.0):
+        """
+        Start and end of every note in seconds, converted from ticks.
+
+        :param tempo: (int) Tempo in BPM
+        :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+        :return: (tuple) numpy arrays (starts, ends)
+        """
+        seconds_per_tick = midi_writer.tick_scale(tempo, music_generator.TICKS_PER_BEAT)
+        starts, ends = self.ticks(note_length_fraction)
+        return starts * seconds_per_tick, ends * seconds_per_tick
+
+    def render_ticks(self, key_name="C Major", note_length_fraction=1.0,
+                     resolution=music_generator.TICKS_PER_BEAT, velocity=music_generator.DEFAULT_VELOCITY):
+        """
+        :param key_name: (str) Key name
+        :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+        :param resolution: (int) Ticks per quarter note
+        :param velocity: (int) Velocity of every note
+        :return: (NoteBuffer) Notes with times in ticks
+        """
+        pitches = self.pitches(key_name)
+        starts, ends = self.ticks(note_length_fraction, resolution)
+        velocities = np.full(len(pitches), velocity, dtype=np.uint8)
+        return NoteBuffer.from_columns(pitches, starts, ends, velocities, resolution)
+
+    def render(self, key_name="C Major", tempo=120, note_length_fraction=1.0,
+               velocity=music_generator.DEFAULT_VELOCITY):
+        """
+        :param key_name: (str) Key name
+        :param tempo: (int) Tempo in BPM
+        :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+        :param velocity: (int) Velocity of every note
+        :return: (NoteBuffer) Notes with times in seconds
+        """
+        pitches = self.pitches(key_name)
+        starts, ends = self.timing(tempo, note_length_fraction)
+        velocities = np.full(len(pitches), velocity, dtype=np.uint8)
+        return NoteBuffer.from_columns(pitches, starts, ends, velocities)
+
+    def to_midi(self, filename, key_name="C Major", tempo=120, instrument_program=0,
+                note_length_fraction=1.0, return_bytes=False):
+        """
+        :param filename: (str or binary stream) Output MIDI filename or writable stream
+        :param key_name: (str) Key name
+        :param tempo: (int) Tempo in BPM
+        :param instrument_program: (int) MIDI program number (instrument)
+        :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+        :param return_bytes: (bool) Return the MIDI bytes instead of writing a file
+        :return: filename, or (bytes) MIDI data if return_bytes
+        """
+        notes = self.render_ticks(key_name, note_length_fraction)
+        return music_generator.write_notes(
+            filename, notes, tempo, instrument_program, return_bytes, "composition"
+        )
+
+    def to_wav(self, filename, key_name="C Major", tempo=120, instrument_program=0,
+               note_length_fraction=1.0, sample_rate=audio_renderer.SAMPLE_RATE):
+        """
+        :param filename: (str) Output WAV filename
+        :param key_name: (str) Key name
+        :param tempo: (int) Tempo in BPM
+        :param instrument_program: (int) MIDI program number (instrument)
+        :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+        :param sample_rate: (int) Samples per second
+        :return: filename
+        """
+        notes = self.render(key_name, tempo, note_length_fraction)
+        return audio_renderer.render_to_wav(filename, notes, instrument_program, sample_rate)
+
+
+def composition_events(mode, scale_length, note_count=16, leap_probability=0.1, max_leap_size=4,
+                       contour="arch", rng=None):
+    """
+    (scale index, beats) events of a generation mode.
+
+    :param mode: (str) 'Scale', 'Random Melody' or 'Rule-Based Melody'
+    :param scale_length: (int) Number of notes in the scale
+    :param note_count: (int) Number of notes (ignored for 'Scale')
+    :param leap_probability: (float) Probability of leaps ('Rule-Based Melody')
+    :param max_leap_size: (int) Maximum leap size in scale degrees ('Rule-Based Melody')
+    :param contour: (str) 'arch', 'ascending', 'descending', or 'random' ('Rule-Based Melody')
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: (tuple) (generator of events, number of events)
+    """
+    if mode == "Scale":
+        return music_generator.iter_scale_indices(scale_length), 2 * scale_length - 1
+    if mode == "Random Melody":
+        return music_generator.iter_random_indices(scale_length, note_count, rng), note_count
+    if mode == "Rule-Based Melody":
+        return music_generator.iter_rule_based_indices(
+            scale_length, note_count, leap_probability, max_leap_size, contour, rng=rng
+        ), note_count
+    raise ValueError(f"Unknown mode: {mode}")
+
+
+@lru_cache(maxsize=COMPOSITION_CACHE_SIZE)
+def _cached_composition(mode, scale_length, note_count, leap_probability, max_leap_size, contour, seed):
+    events, _ = composition_events(mode, scale_length, note_count, leap_probability, max_leap_size, contour, seed)
+    return Composition.from_events(events, scale_length)
+
+
+def compose(mode, scale_length, note_count=16, leap_probability=0.1, max_leap_size=4,
+            contour="arch", rng=None):
+    """
+    Compose a melody once, to be rendered into any key of the same scale length.
+
+    Compositions that the arguments fully determine (a 'Scale', or an int
+    seed) are cached, so asking again is free.
+
+    :param mode: (str) 'Scale', 'Random Melody' or 'Rule-Based Melody'
+    :param scale_length: (int) Number of notes in the scale, e.g. len(ScaleLibrary.scale(key_name))
+    :param note_count: (int) Number of notes (ignored for 'Scale')
+    :param leap_probability: (float) Probability of leaps ('Rule-Based Melody')
+    :param max_leap_size: (int) Maximum leap size in scale degrees ('Rule-Based Melody')
+    :param contour: (str) 'arch', 'ascending', 'descending', or 'random' ('Rule-Based Melody')
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: (Composition) The composition
+    """
+    if mode == "Scale":
+        return _cached_composition(mode, scale_length, None, None, None, None, None)
+    if isinstance(rng, int):
+        return _cached_composition(mode, scale_length, note_count, leap_probability, max_leap_size, contour, rng)
+    events, _ = composition_events(mode, scale_length, note_count, leap_probability, max_leap_size, contour, rng)
+    return Composition.from_events(events, scale_length)
@@ -0,0 +1,277 @@
+# constrained_melody.py
+# version 0.1
+
+from functools import lru_cache
+
+import numpy as np
+
+import music_generator
+from generation_plan import generation_plan
+from note_buffer import NoteBuffer
+from scale_library import ScaleLibrary
+
+# moves of more than this many scale steps count as leaps
+MAX_STEP = 2
+
+# number of samplers kept by constrained_sampler
+SAMPLER_CACHE_SIZE = 32
+
+
+def rule_transition_matrix(plan, phase):
+    """
+    Probability of moving from scale index c to c' in one note of the
+    rule-based generator: a uniform choice of the phase's step options, or
+    with the leap probability a uniform choice from the leap table, then
+    clamped to the scale boundaries (so boundary indices collect the mass of
+    every move that would leave the scale).
+
+    :param plan: (GenerationPlan) Compiled rule set
+    :param phase: (int) Contour phase
+    :return: (numpy.ndarray) (scale_length, scale_length) row-stochastic matrix
+    """
+    steps = plan.phase_steps[phase]
+    leap_probability = plan.leap_probability if plan.leap_steps else 0.0
+
+    offsets = {}
+    for step in steps:
+        offsets[step] = offsets.get(step, 0.0) + (1 - leap_probability) / len(steps)
+    for leap in plan.leap_steps:
+        offsets[leap] = offsets.get(leap, 0.0) + leap_probability / len(plan.leap_steps)
+
+    matrix = np.zeros((plan.scale_length, plan.scale_length))
+    rows = np.arange(plan.scale_length)
+    for offset, probability in offsets.items():
+        columns = np.clip(rows + offset, plan.lowest_index, plan.highest_index)
+        np.add.at(matrix, (rows, columns), probability)
+    return matrix
+
+
+class ConstrainedMelodySampler:
+    """
+    Samples rule-based melodies that satisfy hard constraints, without retries.
+
+    A backward pass builds, for every position and state (scale index,
+    current run of repeated pitches, leaps used so far), the total weight of
+    all valid completions. Sampling then walks forward choosing each next
+    note in proportion to transition weight times completion weight, so
+    every sample is valid and costs O(note_count * scale_length).
+
+    With weighting 'uniform' every valid melody (reachable by the rule-based
+    moves) is equally likely; with 'rule' melodies follow the rule-based
+    step/leap probabilities, conditioned on the constraints.
+    """
+
+    def __init__(
+            self,
+            key_name="C Major",
+            note_count=16,
+            leap_probability=0.1,
+            max_leap_size=4,
+            contour="arch",
+            min_pitch=None,
+            max_pitch=None,
+            start_on_tonic=False,
+            end_degree=None,
+            max_repeats=None,
+            max_leaps=None,
+            weighting="uniform"
+    ):
+        """
+        :param key_name: (str) Name of the key to generate melodies with
+        :param note_count: (int) Number of notes per melody
+        :param leap_probability: (float) Probability of occasional leaps instead of steps
+        :param max_leap_size: (int) Maximum leap size in scale degrees
+        :param contour: (str) 'arch', 'ascending', 'descending', or 'random'
+        :param min_pitch: (int) Lowest allowed MIDI pitch
+        :param max_pitch: (int) Highest allowed MIDI pitch
+        :param start_on_tonic: (bool) Start on any tonic in range instead of the middle of the scale
+        :param end_degree: (int) Scale degree of the last note (0 = end on the tonic)
+        :param max_repeats: (int) Most times in a row the same pitch may sound
+        :param max_leaps: (int) Most moves of more than MAX_STEP scale steps
+        :param weighting: (str) 'uniform' or 'rule'
+        """
+        if note_count < 1:
+            raise ValueError("note_count must be at least 1")
+        if weighting not in ("uniform", "rule"):
+            raise ValueError(f"Unknown weighting: {weighting}")
+
+        table = ScaleLibrary.scale_table(key_name)
+        self.key_scale = np.asarray(table.notes)
+        self.note_count = note_count
+        scale_length = len(self.key_scale)
+        pitches = self.key_scale
+        degrees = np.array([table.degrees[note] for note in table.notes])
+
+        allowed = np.ones(scale_length, dtype=bool)
+        if min_pitch is not None:
+            allowed &= pitches >= min_pitch
+        if max_pitch is not None:
+            allowed &= pitches <= max_pitch
+
+        start = np.zeros(scale_length, dtype=bool)
+        if start_on_tonic:
+            start[degrees == 0] = True
+        else:
+            start[scale_length // 2] = True
+        start &= allowed
+
+        end = allowed.copy()
+        if end_degree is not None:
+            end &= degrees == end_degree
+
+        # split every transition matrix by the kind of move it makes
+        moves = np.subtract.outer(np.arange(scale_length), np.arange(scale_length))
+        same_pitch = np.equal.outer(pitches, pitches)
+        leap = (np.abs(moves) > MAX_STEP) & (max_leaps is not None)
+        repeat = same_pitch & (max_repeats is not None)
+        step = ~leap & ~repeat
+        into_allowed = allowed[None, :]
+
+        plan = generation_plan(contour, leap_probability, max_leap_size, scale_length)
+        # phase of the move into each position 1..note_count-1
+        self._phases = np.searchsorted(plan.phase_cutoffs(note_count), np.arange(1, note_count), side="right")
+        self._transitions = []
+        for phase in range(len(plan.phase_steps)):
+            matrix = rule_transition_matrix(plan, phase)
+            if weighting == "uniform":
+                matrix = (matrix > 0).astype(np.float64)
+            matrix = matrix * into_allowed
+            self._transitions.append((matrix * repeat, matrix * step, matrix * leap))
+
+        runs = max_repeats if max_repeats is not None else 1
+        leap_counts = max_leaps + 1 if max_leaps is not None else 1
+
+        # completion weights per position: (scale index, run - 1, leaps used),
+        # each layer scaled to a maximum of 1 to stay within float range
+        weights = np.zeros((note_count, scale_length, runs, leap_counts))
+        weights[-1] = end[:, None, None]
+        for i in range(note_count - 2, -1, -1):
+            weights[i] = self._completion(i, weights[i + 1])
+            peak = weights[i].max()
+            if peak > 0:
+                weights[i] /= peak
+
+        start_weights = weights[0, :, 0, 0] * start
+        if start_weights.sum() == 0:
+            raise ValueError("No melody satisfies the constraints")
+        self._weights = weights
+        self._start_weights = start_weights / start_weights.sum()
+
+    def _completion(self, i, following):
+        """
+        Weight of every state at position i given the weights at position i + 1.
+        """
+        repeat, step, leap = self._transitions[self._phases[i]]
+        result = np.zeros_like(following)
+        # a repeated pitch extends the run; anything else starts a new run
+        result[:, :-1, :] += np.einsum("cd,drk->crk", repeat, following[:, 1:, :])
+        result += (step @ following[:, 0, :])[:, None, :]
+        # a leap uses up one of the allowed leaps
+        result[:, :, :-1] += (leap @ following[:, 0, 1:])[:, None, :]
+        return result
+
+    def sample_indices(self, rng=None):
+        """
+        :param rng: (int or numpy.random.Generator) Seed or random generator (default: fresh generator)
+        :return: (numpy.ndarray) Scale indices of one valid melody
+        """
+        rng = np.random.default_rng(rng)
+        weights = self._weights
+
+        indices = np.empty(self.note_count, dtype=np.int64)
+        current = rng.choice(len(self._start_weights), p=self._start_weights)
+        run = 0
+        leaps = 0
+        indices[0] = current
+
+        for i in range(1, self.note_count):
+            repeat, step, leap = self._transitions[self._phases[i - 1]]
+            following = weights[i]
+            choice = step[current] * following[:, 0, leaps]
+            if run + 1 < following.shape[1]:
+                choice = choice + repeat[current] * following[:, run + 1, leaps]
+            if leaps + 1 < following.shape[2]:
+                choice = choice + leap[current] * following[:, 0, leaps + 1]
+
+            cumulative = np.cumsum(choice)
+            following_index = int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right"))
+
+            if repeat[current, following_index] > 0:
+                run += 1
+            else:
+                run = 0
+            if leap[current, following_index] > 0:
+                leaps += 1
+            current = following_index
+            indices[i] = current
+
+        return indices
+
+    def sample_pitches(self, rng=None):
+        """
+        :param rng: (int or numpy.random.Generator) Seed or random generator (default: fresh generator)
+        :return: (numpy.ndarray) MIDI pitches of one valid melody
+        """
+        return self.key_scale[self.sample_indices(rng)]
+
+
+@lru_cache(maxsize=SAMPLER_CACHE_SIZE)
+def constrained_sampler(*args, **kwargs):
+    """
+    ConstrainedMelodySampler for these arguments, built once and then reused.
+    """
+    return ConstrainedMelodySampler(*args, **kwargs)
+
+
+def generate_constrained_melody(
+        filename="constrained_melody.mid",
+        key_name="C Major",
+        tempo=120,
+        instrument_program=0,
+        note_length_fraction=1.0,
+        note_count=16,
+        leap_probability=0.1,
+        max_leap_size=4,
+        contour="arch",
+        min_pitch=None,
+        max_pitch=None,
+        start_on_tonic=False,
+        end_degree=None,
+        max_repeats=None,
+        max_leaps=None,
+        weighting="uniform",
+        return_bytes=False,
+        rng=None
+):
+    """
+    Generate a rule-based melody that satisfies hard constraints and save it to a MIDI file.
+
+    See ConstrainedMelodySampler for the constraints.
+
+    :param filename: (str or binary stream) Output MIDI filename or writable stream
+    :param tempo: (int) Tempo in BPM
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :param return_bytes: (bool) Return the MIDI bytes instead of writing a file
+    :param rng: (int or numpy.random.Generator) Seed or random generator (default: fresh generator)
+    :return: filename, or (bytes) MIDI data if return_bytes
+    """
+    sampler = constrained_sampler(
+        key_name, note_count, leap_probability, max_leap_size, contour,
+        min_pitch, max_pitch, start_on_tonic, end_degree, max_repeats, max_leaps, weighting,
+    )
+    pitches = sampler.sample_pitches(rng)
+
+    ticks_per_beat = music_generator.beat_ticks(note_length_fraction)
+    ticks = np.rint(np.arange(note_count + 1) * ticks_per_beat).astype(np.int64)
+    notes = NoteBuffer.from_columns(
+        pitches.astype(np.uint8),
+        ticks[:-1],
+        ticks[1:],
+        np.full(note_count, music_generator.DEFAULT_VELOCITY, dtype=np.uint8),
+        music_generator.TICKS_PER_BEAT,
+    )
+
+    return music_generator.write_notes(
+        filename, notes, tempo, instrument_program, return_bytes, "generate_constrained_melody"
+    )
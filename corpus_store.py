@@ -0,0 +1,240 @@
+# corpus_store.py
+# version 0.1
+#
+# Ingests a directory tree of MIDI files into a columnar note store: one raw
+# binary file per note column plus an offsets index, opened memory-mapped so
+# millions of notes can be scanned without re-parsing or loading them all.
+#
+#   python corpus_store.py midi_folder corpus_store
+
+import argparse
+import contextlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from markov_model import find_midi_files
+
+STORE_VERSION = 1
+
+# column name -> dtype of every note in the store
+NOTE_COLUMNS = {
+    "pitch": np.uint8,
+    "velocity": np.uint8,
+    "program": np.uint8,
+    "is_drum": np.bool_,
+    "start": np.float64,
+    "end": np.float64,
+    "file_id": np.uint32,
+}
+
+NOTE_DTYPE = np.dtype([(name, dtype) for name, dtype in NOTE_COLUMNS.items()])
+
+META_FILE = "meta.json"
+OFFSETS_FILE = "offsets.npy"
+
+
+def _column_path(directory, name):
+    return os.path.join(directory, f"{name}.bin")
+
+
+def _parse_file(job):
+    """
+    Worker: read every note of one MIDI file, ordered by start and pitch.
+
+    :param job: (tuple) (file_id, path)
+    :return: (numpy.ndarray) NOTE_DTYPE notes, or None if the file cannot be read
+    """
+    file_id, path = job
+    # pretty_midi pulls in mido, so only import it in the workers
+    import pretty_midi
+
+    try:
+        midi = pretty_midi.PrettyMIDI(path)
+    except Exception:
+        return None
+
+    notes = np.zeros(sum(len(instrument.notes) for instrument in midi.instruments), dtype=NOTE_DTYPE)
+    position = 0
+    for instrument in midi.instruments:
+        count = len(instrument.notes)
+        rows = notes[position:position + count]
+        rows["pitch"] = [note.pitch for note in instrument.notes]
+        rows["velocity"] = [note.velocity for note in instrument.notes]
+        rows["start"] = [note.start for note in instrument.notes]
+        rows["end"] = [note.end for note in instrument.notes]
+        rows["program"] = instrument.program
+        rows["is_drum"] = instrument.is_drum
+        position += count
+
+    notes["file_id"] = file_id
+    return notes[np.lexsort((notes["pitch"], notes["start"]))]
+
+
+def ingest(source, directory, workers=None, chunksize=None):
+    """
+    Parse MIDI files on a process pool and write their notes into a new store.
+
+    Notes are appended to the column files as results come in, file by file
+    in path order, so memory use does not grow with the corpus. Files that
+    cannot be read are recorded with no notes.
+
+    :param source: (str or list) Directory to search recursively, or MIDI file paths
+    :param directory: (str) Store directory to create (existing column files are replaced)
+    :param workers: (int) Number of worker processes (default: CPU count)
+    :param chunksize: (int) Files sent to a worker at a time (default: spread ~4 chunks per worker)
+    :return: (NoteStore) The new store
+    """
+    paths = find_midi_files(source) if isinstance(source, str) else list(source)
+    jobs = list(enumerate(paths))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(jobs) // (workers * 4))
+
+    os.makedirs(directory, exist_ok=True)
+    # a store without its meta file is incomplete: remove the old one before
+    # touching the columns, so a failed re-ingest cannot look like a valid store
+    for name in (META_FILE, OFFSETS_FILE):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(directory, name))
+
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    failed = []
+
+    columns = {name: open(_column_path(directory, name), "wb") for name in NOTE_COLUMNS}
+    try:
+        if workers <= 1 or len(jobs) <= 1:
+            executor = None
+            results = map(_parse_file, jobs)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_parse_file, jobs, chunksize=chunksize)
+
+        try:
+            for file_id, notes in enumerate(results):
+                if notes is None:
+                    failed.append(file_id)
+                    notes = np.zeros(0, dtype=NOTE_DTYPE)
+                for name, f in columns.items():
+                    f.write(np.ascontiguousarray(notes[name]).tobytes())
+                offsets[file_id + 1] = offsets[file_id] + len(notes)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    finally:
+        for f in columns.values():
+            f.close()
+
+    np.save(os.path.join(directory, OFFSETS_FILE), offsets)
+
+    # written last, see above
+    meta = {
+        "version": STORE_VERSION,
+        "note_count": int(offsets[-1]),
+        "columns": {name: np.dtype(dtype).str for name, dtype in NOTE_COLUMNS.items()},
+        "files": paths,
+        "failed": failed,
+    }
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+    return NoteStore(directory)
+
+
+class NoteStore:
+    """
+    Read-only, memory-mapped view of a store written by ingest().
+
+    Columns are NumPy memmaps, so slicing or reducing them only reads the
+    pages that are touched. Notes of file i are rows offsets[i]..offsets[i + 1].
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: (str) Store directory
+        """
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        if meta["version"] != STORE_VERSION:
+            raise ValueError(f"Unsupported store version: {meta['version']}")
+
+        self.directory = directory
+        self.paths = meta["files"]
+        self.failed = meta["failed"]
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+
+        note_count = meta["note_count"]
+        self.columns = {}
+        for name, dtype in meta["columns"].items():
+            if note_count == 0:
+                # numpy cannot memory-map an empty file
+                self.columns[name] = np.zeros(0, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(
+                    _column_path(directory, name), dtype=dtype, mode="r", shape=(note_count,)
+                )
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, name):
+        """
+        :param name: (str) Column name, e.g. 'pitch'
+        :return: (numpy.memmap) The whole column
+        """
+        return self.columns[name]
+
+    @property
+    def file_count(self):
+        return len(self.paths)
+
+    def notes(self, first=0, last=None):
+        """
+        Copy rows first..last of every column into one structured array.
+
+        :param first: (int) First row
+        :param last: (int) Row after the last one (default: end of the store)
+        :return: (numpy.ndarray) NOTE_DTYPE notes
+        """
+        last = len(self) if last is None else last
+        notes = np.empty(last - first, dtype=NOTE_DTYPE)
+        for name, column in self.columns.items():
+            notes[name] = column[first:last]
+        return notes
+
+    def file_notes(self, file_id):
+        """
+        :param file_id: (int) Index of the file in paths
+        :return: (numpy.ndarray) NOTE_DTYPE notes of that file
+        """
+        return self.notes(int(self.offsets[file_id]), int(self.offsets[file_id + 1]))
+
+    def iter_chunks(self, chunk_size=1 << 20):
+        """
+        Scan the whole store in structured-array chunks of bounded size.
+
+        :param chunk_size: (int) Notes per chunk
+        :return: generator of NOTE_DTYPE arrays
+        """
+        for first in range(0, len(self), chunk_size):
+            yield self.notes(first, min(first + chunk_size, len(self)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest MIDI files into a columnar note store.")
+    parser.add_argument("source", help="directory to search for MIDI files")
+    parser.add_argument("store", help="store directory to write")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    store = ingest(args.source, args.store, workers=args.workers)
+    print(f"{len(store)} notes from {store.file_count - len(store.failed)} files "
+          f"({len(store.failed)} unreadable) stored in {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# generation_plan.py
+# version 0.1
+
+import math
+from functools import lru_cache
+
+# Contour shapes as data: (end of phase as a fraction of the phrase, step
+# options) for each phase in order. A position p of a phrase of length n is
+# in the first phase with p < fraction * n. Add new shapes before the first
+# plan using them is compiled.
+CONTOURS = {
+    "arch": ((0.5, (1, 2)), (1.0, (-2, -1))),
+    "ascending": ((1.0, (1, 2)),),
+    "descending": ((1.0, (-2, -1)),),
+    "random": ((1.0, (-2, -1, 0, 1, 2)),),
+}
+
+# contour used for names not in CONTOURS
+DEFAULT_CONTOUR = "random"
+
+# number of plans kept by generation_plan
+PLAN_CACHE_SIZE = 128
+
+
+class GenerationPlan:
+    """
+    Rule set of the rule-based melody generator, compiled for one parameter set.
+
+    Holds the step options of every contour phase, the leap table and the
+    clamp bounds. Plans are immutable and shared through generation_plan().
+    """
+
+    def __init__(self, contour, leap_probability, max_leap_size, scale_length):
+        """
+        :param contour: (str) Name of a contour in CONTOURS
+        :param leap_probability: (float) Probability of occasional leaps instead of steps
+        :param max_leap_size: (int) Maximum leap size in scale degrees
+        :param scale_length: (int) Number of notes in the scale
+        """
+        self.contour = contour
+        self.leap_probability = leap_probability
+        self.max_leap_size = max_leap_size
+        self.scale_length = scale_length
+
+        phases = CONTOURS.get(contour, CONTOURS[DEFAULT_CONTOUR])
+        self.phase_ends = tuple(end for end, _ in phases)
+        self.phase_steps = tuple(tuple(steps) for _, steps in phases)
+        self.leap_steps = tuple(s for s in range(-max_leap_size, max_leap_size + 1) if s != 0)
+
+        # clamp bounds of the scale index
+        self.lowest_index = 0
+        self.highest_index = scale_length - 1
+
+    def phase_cutoffs(self, phrase_length):
+        """
+        First position of every phase after the first, in a phrase of
+        phrase_length notes. The phase of position p is the number of cutoffs
+        at or below p: bisect.bisect_right(cutoffs, p), or numpy.searchsorted
+        with side='right' for many positions at once.
+
+        :param phrase_length: (int) Notes per contour phrase
+        :return: (tuple) len(phase_steps) - 1 non-decreasing ints
+        """
+        cutoffs = []
+        cutoff = 0
+        for end in self.phase_ends[:-1]:
+            # p < end * n holds for an int p exactly when p < ceil(end * n)
+            cutoff = max(cutoff, math.ceil(phrase_length * end))
+            cutoffs.append(cutoff)
+        return tuple(cutoffs)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def generation_plan(contour, leap_probability, max_leap_size, scale_length):
+    """
+    The GenerationPlan for these settings, compiled once and then reused.
+
+    :param contour: (str) Name of a contour in CONTOURS
+    :param leap_probability: (float) Probability of occasional leaps instead of steps
+    :param max_leap_size: (int) Maximum leap size in scale degrees
+    :param scale_length: (int) Number of notes in the scale
+    :return: (GenerationPlan) The plan
+    """
+    return GenerationPlan(contour, leap_probability, max_leap_size, scale_length)
@@ -0,0 +1,115 @@
+# generation_worker.py
+# version 0.1
+
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+import midi_writer
+import output_cache
+from scale_library import ScaleLibrary
+
+# number of progress updates sent over a whole generation
+PROGRESS_STEPS = 100
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class GenerationWorker(QObject):
+    """
+    Runs one generation request off the GUI thread.
+
+    Move it to a QThread and connect the thread's started signal to run().
+    Exactly one of finished, failed or cancelled is emitted at the end.
+    """
+
+    progress = pyqtSignal(int, int)     # notes generated, total notes
+    composed = pyqtSignal(object)       # Composition being rendered (not sent on cache hits)
+    finished = pyqtSignal(str)          # filename
+    failed = pyqtSignal(str)            # error message
+    cancelled = pyqtSignal()
+
+    def __init__(self, request, cache=None, parent=None):
+        """
+        :param request: (dict) mode, filename, key_name, tempo, note_length_fraction,
+                        instrument_program, note_count and seed (None = random), and
+                        optionally a composition to render instead of composing
+        :param cache: (OutputCache) Cache of generated files, or None
+        """
+        super().__init__(parent)
+        self.request = request
+        self.cache = cache
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Ask the worker to stop; safe to call from any thread."""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def _events(self, events, total):
+        """
+        Pass events through, reporting progress and stopping when cancelled.
+        """
+        interval = max(1, total // PROGRESS_STEPS)
+        for count, event in enumerate(events, 1):
+            if self.is_cancelled():
+                raise GenerationCancelled()
+            yield event
+            if count % interval == 0:
+                self.progress.emit(count, total)
+        self.progress.emit(total, total)
+
+    def _composition(self):
+        """
+        The request's composition, composed here unless the request carries one.
+        """
+        composition = self.request.get("composition")
+        if composition is not None:
+            return composition
+
+        # composition needs numpy, which is only loaded once the first generation runs
+        from composition import Composition, composition_events
+
+        request = self.request
+        scale_length = len(ScaleLibrary.scale(request["key_name"]))
+        events, total = composition_events(
+            request["mode"], scale_length, request["note_count"], rng=request.get("seed")
+        )
+        return Composition.from_events(self._events(events, total), scale_length)
+
+    def run(self):
+        try:
+            cache = self.cache if self.cache is not None and output_cache.is_cacheable(self.request) else None
+            key = output_cache.cache_key(self.request) if cache is not None else None
+            data = cache.get(key) if cache is not None else None
+
+            if data is None:
+                composition = self._composition()
+
+                if self.is_cancelled():
+                    raise GenerationCancelled()
+                self.composed.emit(composition)
+
+                data = composition.to_midi(
+                    None,
+                    self.request["key_name"],
+                    self.request["tempo"],
+                    self.request["instrument_program"],
+                    self.request["note_length_fraction"],
+                    return_bytes=True,
+                )
+                if cache is not None:
+                    cache.put(key, data)
+
+            filename = midi_writer.write_bytes(self.request["filename"], data)
+
+        except GenerationCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(filename)
@@ -2,16 +2,17 @@
 
 import sys
 import os
-import subprocess
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QVBoxLayout,
     QMessageBox, QComboBox, QMenuBar, QFileDialog,
-    QFormLayout, QSpinBox
+    QFormLayout, QSpinBox, QProgressBar, QHBoxLayout
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread
 
-import music_generator
-from music_generator import INSTRUMENTS, NOTE_LENGTHS, generate_scale, generate_random_melody, generate_melody_rule_based
+from music_generator import INSTRUMENTS, NOTE_LENGTHS
+from generation_worker import GenerationWorker
+from output_cache import OutputCache
+from scale_library import ScaleLibrary
 from slider_spinner import SliderSpinner
 
 class MelodyGenerator(QWidget):
@@ -19,6 +20,14 @@ class MelodyGenerator(QWidget):
         super().__init__()
 
         self.loaded_midi_path = None   # Store loaded MIDI file
+
+        # Background generation
+        self.generation_thread = None
+        self.generation_worker = None
+        self.pending_request = None    # newest request waiting for the current one to stop
+        self.output_cache = OutputCache()
+        self.composition = None        # (composition params, render params, Composition) of the last melody
+
         self.initUI()
 
     def initUI(self):
@@ -30,10 +39,10 @@ class MelodyGenerator(QWidget):
 
         # Controls
         self.key_dropdown = QComboBox()
-        self.key_dropdown.addItems([
-            'C Major', 'D Major', 'E Major', 'F Major',
-            'G Major', 'A Major', 'B Major', 'Bb Major', 'Eb Major'
-        ])
+        self.key_dropdown.addItems(ScaleLibrary.ROOT_NOTES.keys())
+
+        self.scale_dropdown = QComboBox()
+        self.scale_dropdown.addItems(ScaleLibrary.MODE_STEPS.keys())
 
         self.mode_dropdown = QComboBox()
         self.mode_dropdown.addItems([
@@ -52,10 +61,21 @@ class MelodyGenerator(QWidget):
         self.num_notes_spinner.setRange(4, 64)
         self.num_notes_spinner.setValue(16)
 
+        self.seed_spinner = QSpinBox()
+        self.seed_spinner.setRange(0, 2 ** 31 - 1)
+        self.seed_spinner.setSpecialValueText("Random")   # 0 = new melody every time
+
         # Buttons
         self.generate_button = QPushButton("Generate")
         self.generate_button.clicked.connect(self.generate_music)
 
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_generation)
+        self.cancel_button.setEnabled(False)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+
         self.load_button = QPushButton("Load MIDI")
         self.load_button.clicked.connect(self.load_midi_file)
 
@@ -65,21 +85,28 @@ class MelodyGenerator(QWidget):
 
         # Add widgets to layout
         self.form_layout.addRow("Key:", self.key_dropdown)
+        self.form_layout.addRow("Scale:", self.scale_dropdown)
         self.form_layout.addRow("Mode:", self.mode_dropdown)
         self.form_layout.addRow("Instrument:", self.instrument_dropdown)
         self.form_layout.addRow("Note Length:", self.note_length_dropdown)
         self.form_layout.addRow("Tempo:", self.tempo_control)
         self.form_layout.addRow("Number of Notes:", self.num_notes_spinner)
+        self.form_layout.addRow("Seed:", self.seed_spinner)
+
+        self.generate_layout = QHBoxLayout()
+        self.generate_layout.addWidget(self.generate_button)
+        self.generate_layout.addWidget(self.cancel_button)
 
         self.layout.addLayout(self.form_layout)
-        self.layout.addWidget(self.generate_button)
+        self.layout.addLayout(self.generate_layout)
+        self.layout.addWidget(self.progress_bar)
         self.layout.addWidget(self.load_button)
         self.layout.addWidget(self.play_button)
 
         self.setLayout(self.layout)
 
     def generate_music(self):
-        key = self.key_dropdown.currentText()
+        key = f"{self.key_dropdown.currentText()} {self.scale_dropdown.currentText()}"
         instrument_name = self.instrument_dropdown.currentText()
         instrument = INSTRUMENTS[instrument_name]
         note_length_name = self.note_length_dropdown.currentText()
@@ -87,6 +114,7 @@ class MelodyGenerator(QWidget):
         tempo = self.tempo_control.get_value()
         num_notes = self.num_notes_spinner.value()
         mode = self.mode_dropdown.currentText()
+        seed = self.seed_spinner.value() or None
 
         self.filename = f"output_{key.replace(' ', '_')}_{mode.lower().replace(' ', '_')}.mid"
 
@@ -94,43 +122,104 @@ class MelodyGenerator(QWidget):
 
         print(f"[DEBUG] Mode: {mode}, Key: {key}, Tempo: {tempo}, Note Length: {note_length}, Instrument: {instrument}, Notes: {num_notes}")
 
-        try:
-
-            if mode == 'Scale':
-                generate_scale(
-                    filename=self.filename,
-                    key_name=key,
-                    tempo=tempo,
-                    note_length_fraction=note_length,
-                    instrument_program=instrument
-                )
-
-            elif mode == 'Random Melody':
-                generate_random_melody(
-                    filename=self.filename,
-                    key_name=key,
-                    tempo=tempo,
-                    note_length_fraction=note_length,
-                    instrument_program=instrument,
-                    note_count=num_notes
-                )
-
-            elif mode == 'Rule-Based Melody':
-                generate_melody_rule_based(
-                    filename=self.filename,
-                    key_name=key,
-                    tempo=tempo,
-                    note_length_fraction=note_length,
-                    instrument_program=instrument,
-                    note_count=num_notes
-                )
-
-        except Exception as e:
-            print("Error: ", e)
-
-        QMessageBox.information(self, "MIDI Generated", f"MIDI file saved as {self.filename}")
+        request = {
+            "mode": mode,
+            "filename": self.filename,
+            "key_name": key,
+            "tempo": tempo,
+            "note_length_fraction": note_length,
+            "instrument_program": instrument,
+            "note_count": num_notes,
+            "seed": seed,
+        }
+
+        if self.composition is not None:
+            composition_params, render_params, composition = self.composition
+            # Only the key, tempo, note length or instrument changed: render the same melody again
+            if (composition_params == self.composition_params(request)
+                    and render_params != self.render_params(request)):
+                request["composition"] = composition
+
+        if self.generation_thread is not None:
+            # Coalesce clicks: only the newest request runs once the current one stops
+            self.pending_request = request
+            self.generation_worker.cancel()
+            return
+
+        self.start_generation(request)
+
+    def start_generation(self, request):
+        self.generation_thread = QThread(self)
+        self.generation_worker = GenerationWorker(request, self.output_cache)
+        self.generation_worker.moveToThread(self.generation_thread)
+
+        self.generation_thread.started.connect(self.generation_worker.run)
+        self.generation_worker.progress.connect(self.on_generation_progress)
+        self.generation_worker.composed.connect(self.on_composed)
+        self.generation_worker.finished.connect(self.on_generation_finished)
+        self.generation_worker.failed.connect(self.on_generation_failed)
+        for signal in (self.generation_worker.finished,
+                       self.generation_worker.failed,
+                       self.generation_worker.cancelled):
+            signal.connect(self.generation_thread.quit)
+        self.generation_thread.finished.connect(self.on_generation_thread_finished)
+
+        self.progress_bar.setValue(0)
+        self.cancel_button.setEnabled(True)
+        self.generation_thread.start()
+
+    def cancel_generation(self):
+        self.pending_request = None
+        if self.generation_worker is not None:
+            self.generation_worker.cancel()
+
+    @staticmethod
+    def composition_params(request):
+        """
+        Parameters that decide the melody itself; any key with a scale of the
+        same length can play it.
+        """
+        scale_length = len(ScaleLibrary.scale(request["key_name"]))
+        return request["mode"], request["note_count"], request["seed"], scale_length
+
+    @staticmethod
+    def render_params(request):
+        return (request["key_name"], request["tempo"],
+                request["note_length_fraction"], request["instrument_program"])
+
+    def on_composed(self, composition):
+        request = self.generation_worker.request
+        self.composition = (self.composition_params(request), self.render_params(request), composition)
+
+    def on_generation_progress(self, done, total):
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+
+    def on_generation_finished(self, filename):
+        # A newer request is waiting, so this result is already out of date
+        if self.pending_request is not None:
+            return
+        QMessageBox.information(self, "MIDI Generated", f"MIDI file saved as {filename}")
         # self.play_button.setEnabled(True)
 
+    def on_generation_failed(self, message):
+        print("Error: ", message)
+        QMessageBox.critical(self, "Error", f"An error occurred:\n{message}")
+
+    def on_generation_thread_finished(self):
+        self.generation_worker.deleteLater()
+        self.generation_thread.deleteLater()
+        self.generation_worker = None
+        self.generation_thread = None
+        self.cancel_button.setEnabled(False)
+
+        if self.pending_request is not None:
+            request = self.pending_request
+            self.pending_request = None
+            self.start_generation(request)
+        else:
+            self.progress_bar.setValue(0)
+
     def load_midi_file(self):
         options = QFileDialog.Options()
         file_name, _ = QFileDialog.getOpenFileName(
@@ -151,6 +240,9 @@ class MelodyGenerator(QWidget):
 
     def play_loaded_midi(self):
         if self.loaded_midi_path:
+            # imported here to keep it off the startup path
+            import subprocess
+
             try:
                 subprocess.run(["start", "", self.loaded_midi_path], shell=True, check=True)
 
@@ -0,0 +1,84 @@
+# import_budget.py
+# version 0.1
+#
+# Checks that cold-start imports of the GUI and the test driver stay within
+# a time budget. Heavy dependencies (pretty_midi, numpy, mido) must only be
+# imported on first use.
+
+import os
+import subprocess
+import sys
+
+# module -> budget in milliseconds (cumulative import time, cold start)
+IMPORT_BUDGETS_MS = {
+    "gui_app": 150,
+    "test_driver": 50,
+}
+
+# modules that must never be imported just by starting up
+DEFERRED_MODULES = ["pretty_midi", "numpy", "mido"]
+
+
+def measure_import(module_name, repeats=3):
+    """
+    Measure the cold-start import time of a module with python -X importtime.
+
+    :param module_name: (str) Module to import
+    :param repeats: (int) Number of fresh interpreters to try; the fastest run is kept
+    :return: (tuple) (milliseconds, set of every module imported along the way)
+    """
+    env = dict(os.environ)
+    # the GUI module only imports Qt, it never opens a window
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    best = None
+    imported = set()
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+            cwd=here,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        cumulative_us = None
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if not cumulative.strip().isdigit():
+                continue  # header line
+            imported.add(name.strip())
+            if name.rstrip() == f" {module_name}":
+                cumulative_us = int(cumulative)
+        if cumulative_us is None:
+            raise RuntimeError(f"No import time reported for {module_name}")
+        if best is None or cumulative_us < best:
+            best = cumulative_us
+
+    return best / 1000, imported
+
+
+def main():
+    failures = []
+
+    for module_name, budget_ms in IMPORT_BUDGETS_MS.items():
+        elapsed_ms, imported = measure_import(module_name)
+        status = "ok" if elapsed_ms <= budget_ms else "OVER BUDGET"
+        print(f"{module_name}: {elapsed_ms:.1f} ms (budget {budget_ms} ms) {status}")
+        if elapsed_ms > budget_ms:
+            failures.append(module_name)
+
+        eager = [name for name in DEFERRED_MODULES if name in imported]
+        if eager:
+            print(f"{module_name}: imports {', '.join(eager)} at startup")
+            failures.append(module_name)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
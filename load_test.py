@@ -0,0 +1,132 @@
+# load_test.py
+# version 0.1
+#
+# Load test for music_server.py: opens keep-alive connections, sends GET
+# requests as fast as each connection allows and reports throughput and
+# latency of the successful (200) responses, and how many were rejected.
+#
+#   python load_test.py --connections 32 --requests 2000
+#   python load_test.py --url http://127.0.0.1:8000 --path "/scale?key=A+Minor"
+
+import argparse
+import asyncio
+import collections
+import time
+from urllib.parse import urlsplit
+
+import music_server
+
+DEFAULT_PATH = "/rule-based?key=C+Major&note_count=16&seed=1"
+
+
+async def _send_requests(host, port, path, count, latencies, statuses):
+    """
+    Send count requests one after another over a single keep-alive connection.
+    Only 200 responses add to latencies; every response is counted in statuses.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    request = (f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n").encode("latin-1")
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                # server closed the connection; reconnect and carry on
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                statuses["closed"] += 1
+                continue
+            status = int(status_line.split()[1])
+
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def run_load_test(host, port, path=DEFAULT_PATH, connections=16, requests=1000):
+    """
+    :param host: (str) Server host
+    :param port: (int) Server port
+    :param path: (str) Request path including the query string
+    :param connections: (int) Concurrent keep-alive connections
+    :param requests: (int) Total number of requests
+    :return: (dict) requests_per_second and latency percentiles in ms of 200 responses,
+        rejected (429) count and all status counts
+    """
+    latencies = []
+    statuses = collections.Counter()
+
+    per_connection = [requests // connections + (i < requests % connections) for i in range(connections)]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _send_requests(host, port, path, count, latencies, statuses)
+        for count in per_connection if count
+    ))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(fraction):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    return {
+        "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "rejected": statuses[429],
+        "statuses": dict(statuses),
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+    }
+
+
+async def _run_with_local_server(workers, path, connections, requests):
+    server = music_server.MusicServer(port=0, workers=workers)
+    await server.start()
+    try:
+        return await run_load_test(server.host, server.port, path, connections, requests)
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the music generation server.")
+    parser.add_argument("--url", default=None,
+                        help="server to test, e.g. http://127.0.0.1:8000 (default: start one here)")
+    parser.add_argument("--workers", type=int, default=None, help="workers of the local server")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="request path and query string")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=1000, help="total number of requests")
+    args = parser.parse_args()
+
+    if args.url is None:
+        results = asyncio.run(_run_with_local_server(args.workers, args.path, args.connections, args.requests))
+    else:
+        url = urlsplit(args.url)
+        results = asyncio.run(run_load_test(
+            url.hostname, url.port or 80, args.path, args.connections, args.requests
+        ))
+
+    print(f"{results['requests_per_second']:.0f} successful requests/s  "
+          f"p50={results['p50_ms']:.2f}ms  p90={results['p90_ms']:.2f}ms  p99={results['p99_ms']:.2f}ms")
+    print(f"rejected (429): {results['rejected']}  statuses: {results['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+# markov_model.py
+# version 0.1
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import music_generator
+from note_buffer import NoteBuffer
+from scale_library import ScaleLibrary
+
+MIDI_EXTENSIONS = (".mid", ".midi")
+
+# Largest interval (in scale steps) kept as its own state; bigger jumps are clipped
+MAX_INTERVAL = 7
+
+# Number of symbols per state type
+STATE_SIZES = {
+    "interval": 2 * MAX_INTERVAL + 1,   # scale-step interval -7..7
+    "degree": 7,                        # scale degree of the note, 0 = tonic
+}
+
+# Above this many transition cells the counts are kept sparse
+DENSE_MAX_CELLS = 1 << 20
+
+# Scale degree of each pitch class above the tonic of a major scale, with
+# chromatic notes snapped down to the degree below
+_MAJOR_DEGREE_OF_SEMITONE = np.array([0, 0, 1, 1, 2, 3, 3, 4, 4, 5, 5, 6])
+
+
+def estimate_tonic(pitches, durations):
+    """
+    Pick the major key whose scale covers most of the sounding time.
+
+    :param pitches: (numpy.ndarray) MIDI note numbers
+    :param durations: (numpy.ndarray) Note lengths in seconds
+    :return: (int) Pitch class of the tonic, 0 = C
+    """
+    histogram = np.bincount(pitches % 12, weights=durations, minlength=12)
+    steps = np.array(ScaleLibrary.MAJOR_SCALE_STEPS[:-1])
+    scores = [histogram[(root + steps) % 12].sum() for root in range(12)]
+    return int(np.argmax(scores))
+
+
+def melody_symbols(pitches, tonic, states="interval"):
+    """
+    Turn a melody into model states.
+
+    The melody is mapped onto the major scale of tonic: 'interval' states are
+    the moves between consecutive notes in scale steps, 'degree' states the
+    scale degree of each note.
+
+    :param pitches: (numpy.ndarray) MIDI note numbers in order
+    :param tonic: (int) Pitch class of the tonic
+    :param states: (str) 'interval' or 'degree'
+    :return: (numpy.ndarray) int8 symbols
+    """
+    octave, semitone = np.divmod(np.asarray(pitches, dtype=np.int64) - tonic, 12)
+    steps = octave * 7 + _MAJOR_DEGREE_OF_SEMITONE[semitone]
+
+    if states == "degree":
+        return (steps % 7).astype(np.int8)
+    intervals = np.clip(np.diff(steps), -MAX_INTERVAL, MAX_INTERVAL)
+    return (intervals + MAX_INTERVAL).astype(np.int8)
+
+
+def _ngram_ids(symbols, order, state_count):
+    """
+    Number every window of order + 1 symbols as a base-state_count integer.
+    """
+    length = len(symbols) - order
+    if length <= 0:
+        return np.zeros(0, dtype=np.int64)
+    ids = np.zeros(length, dtype=np.int64)
+    for offset in range(order + 1):
+        ids = ids * state_count + symbols[offset:offset + length]
+    return ids
+
+
+def _file_ngrams(job):
+    """
+    Worker: parse one MIDI file and count its n-grams.
+
+    Every melodic instrument is reduced to its top line (the highest note of
+    each onset) and counted separately.
+
+    :param job: (tuple) (path, order, states)
+    :return: (tuple) (unique n-gram ids, counts) or None if the file cannot be read
+    """
+    path, order, states = job
+    # pretty_midi pulls in mido, so only import it in the workers
+    import pretty_midi
+
+    try:
+        midi = pretty_midi.PrettyMIDI(path)
+    except Exception:
+        return None
+
+    state_count = STATE_SIZES[states]
+    melodies = []
+    for instrument in midi.instruments:
+        if instrument.is_drum or not instrument.notes:
+            continue
+        notes = np.array([(note.start, -note.pitch, note.end) for note in instrument.notes])
+        notes = notes[np.lexsort((notes[:, 1], notes[:, 0]))]
+        first_of_onset = np.r_[True, np.diff(notes[:, 0]) > 0]
+        notes = notes[first_of_onset]
+        melodies.append((-notes[:, 1].astype(np.int64), notes[:, 2] - notes[:, 0]))
+
+    if not melodies:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    tonic = estimate_tonic(
+        np.concatenate([pitches for pitches, _ in melodies]),
+        np.concatenate([durations for _, durations in melodies]),
+    )
+    ids = np.concatenate([
+        _ngram_ids(melody_symbols(pitches, tonic, states), order, state_count)
+        for pitches, _ in melodies
+    ])
+    return np.unique(ids, return_counts=True)
+
+
+def find_midi_files(directory):
+    """
+    :param directory: (str) Folder to search recursively
+    :return: (list) Sorted paths of every MIDI file below directory
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(MIDI_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def build_alias_table(weights):
+    """
+    Vose alias table for sampling an index in proportion to weights.
+
+    :param weights: (numpy.ndarray) Non-negative weights, not all zero
+    :return: (tuple) (probability, alias) arrays of len(weights)
+    """
+    count = len(weights)
+    scaled = np.asarray(weights, dtype=np.float64) * count / np.sum(weights)
+    probability = np.ones(count)
+    alias = np.arange(count)
+
+    small = [i for i in range(count) if scaled[i] < 1.0]
+    large = [i for i in range(count) if scaled[i] >= 1.0]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        probability[less] = scaled[less]
+        alias[less] = more
+        scaled[more] = scaled[more] + scaled[less] - 1.0
+        if scaled[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+
+    return probability, alias
+
+
+def _alias_draw(rng, probability, alias, first, count):
+    """
+    O(1) draw from the alias table stored at first..first + count.
+    """
+    u = rng.random() * count
+    column = int(u)
+    if u - column < probability[first + column]:
+        return first + column
+    return first + alias[first + column]
+
+
+class MarkovMelodyModel:
+    """
+    n-th order Markov chain over melody intervals or scale degrees.
+
+    Transition counts are kept as a dense (contexts x states) uint32 array
+    when it is small enough, otherwise as sorted sparse (n-gram id, count)
+    arrays. Sampling uses alias tables, so every note costs O(1) whatever
+    the order or corpus size.
+    """
+
+    def __init__(self, order, states, counts):
+        """
+        :param order: (int) Number of previous states a transition depends on
+        :param states: (str) 'interval' or 'degree'
+        :param counts: (numpy.ndarray) Dense counts of shape (state_count ** order, state_count),
+                       or (tuple) sparse (n-gram ids, counts)
+        """
+        if states not in STATE_SIZES:
+            raise ValueError(f"Unknown states: {states}")
+        self.order = order
+        self.states = states
+        self.state_count = STATE_SIZES[states]
+        self.counts = counts
+        self._build_sampler()
+
+    @property
+    def is_sparse(self):
+        return isinstance(self.counts, tuple)
+
+    def _ngram_counts(self):
+        """
+        :return: (tuple) (n-gram ids, counts) of every observed transition
+        """
+        if self.is_sparse:
+            return self.counts
+        ids = np.flatnonzero(self.counts)
+        return ids, self.counts.ravel()[ids]
+
+    def _build_sampler(self):
+        ids, counts = self._ngram_counts()
+        if len(ids) == 0:
+            raise ValueError("No transitions to build a model from")
+
+        contexts, symbols = np.divmod(ids, self.state_count)
+        context_ids, row_starts = np.unique(contexts, return_index=True)
+        row_ends = np.r_[row_starts[1:], len(ids)]
+
+        # alias table of every context, stored back to back
+        self._symbols = symbols.astype(np.int8)
+        self._probability = np.empty(len(ids))
+        self._alias = np.empty(len(ids), dtype=np.int64)
+        self._rows = {}
+        for row, (context, first, last) in enumerate(zip(context_ids.tolist(), row_starts, row_ends)):
+            probability, alias = build_alias_table(counts[first:last])
+            self._probability[first:last] = probability
+            self._alias[first:last] = alias
+            self._rows[context] = (int(first), int(last - first))
+
+        # starting contexts, drawn in proportion to how often they occur
+        self._context_ids = context_ids
+        context_totals = np.add.reduceat(counts, row_starts)
+        self._context_probability, self._context_alias = build_alias_table(context_totals)
+
+        # fallback for contexts never seen in training
+        symbol_totals = np.bincount(symbols, weights=counts, minlength=self.state_count)
+        self._fallback = np.flatnonzero(symbol_totals)
+        self._fallback_probability, self._fallback_alias = build_alias_table(symbol_totals[self._fallback])
+
+    @classmethod
+    def train(cls, source, order=2, states="interval", workers=None, chunksize=None):
+        """
+        Count transitions over a MIDI corpus, parsing the files on a process pool.
+
+        :param source: (str or list) Directory to search recursively, or MIDI file paths
+        :param order: (int) Number of previous states a transition depends on
+        :param states: (str) 'interval' or 'degree'
+        :param workers: (int) Number of worker processes (default: CPU count)
+        :param chunksize: (int) Files sent to a worker at a time (default: spread ~4 chunks per worker)
+        :return: (MarkovMelodyModel) Trained model
+        """
+        if states not in STATE_SIZES:
+            raise ValueError(f"Unknown states: {states}")
+        paths = find_midi_files(source) if isinstance(source, str) else list(source)
+        jobs = [(path, order, states) for path in paths]
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if chunksize is None:
+            chunksize = max(1, len(jobs) // (workers * 4))
+
+        if workers <= 1 or len(jobs) <= 1:
+            results = [_file_ngrams(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_file_ngrams, jobs, chunksize=chunksize))
+
+        parsed = [result for result in results if result is not None]
+        ids = np.concatenate([result[0] for result in parsed] or [np.zeros(0, dtype=np.int64)])
+        counts = np.concatenate([result[1] for result in parsed] or [np.zeros(0, dtype=np.int64)])
+
+        state_count = STATE_SIZES[states]
+        cells = state_count ** (order + 1)
+        if cells <= DENSE_MAX_CELLS:
+            dense = np.bincount(ids, weights=counts, minlength=cells).astype(np.uint32)
+            model_counts = dense.reshape(state_count ** order, state_count)
+        else:
+            unique_ids, inverse = np.unique(ids, return_inverse=True)
+            model_counts = (unique_ids, np.bincount(inverse, weights=counts).astype(np.uint32))
+
+        model = cls(order, states, model_counts)
+        model.file_count = len(parsed)
+        model.skipped_files = len(results) - len(parsed)
+        return model
+
+    def save(self, filename):
+        """
+        :param filename: (str) Output .npz filename
+        """
+        if self.is_sparse:
+            np.savez(filename, order=self.order, states=self.states,
+                     ngram_ids=self.counts[0], ngram_counts=self.counts[1])
+        else:
+            np.savez(filename, order=self.order, states=self.states, counts=self.counts)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        :param filename: (str) .npz file written by save()
+        :return: (MarkovMelodyModel) The model
+        """
+        with np.load(filename) as data:
+            if "counts" in data:
+                counts = data["counts"]
+            else:
+                counts = (data["ngram_ids"], data["ngram_counts"])
+            return cls(int(data["order"]), str(data["states"]), counts)
+
+    def iter_symbols(self, rng=None):
+        """
+        Yield states forever, starting from a context seen in training.
+
+        :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+        :return: generator of int states
+        """
+        rng = music_generator.resolve_rng(rng)
+        state_count = self.state_count
+        context_size = state_count ** self.order
+
+        row = _alias_draw(rng, self._context_probability, self._context_alias, 0, len(self._context_ids))
+        context = int(self._context_ids[row])
+
+        while True:
+            found = self._rows.get(context)
+            if found is None:
+                choice = _alias_draw(rng, self._fallback_probability, self._fallback_alias,
+                                     0, len(self._fallback))
+                symbol = int(self._fallback[choice])
+            else:
+                symbol = int(self._symbols[_alias_draw(rng, self._probability, self._alias, *found)])
+            yield symbol
+            context = (context * state_count + symbol) % context_size
+
+
+def iter_markov_indices(model, key_name="C Major", note_count=None, rng=None):
+    """
+    Yield the scale indices of a melody sampled from a Markov model, with
+    their lengths in beats.
+
+    Interval states move through the scale of key_name by that many steps
+    (clamped to the scale boundaries); degree states move to the nearest
+    note of that degree. The melody starts on the middle tonic, like
+    music_generator.iter_melody_rule_based.
+
+    :param model: (MarkovMelodyModel) Trained model
+    :param key_name: (str) Name of the key to generate melody with
+    :param note_count: (int) Number of notes to generate (None = never stop)
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: generator of (scale index, beats)
+    """
+    table = ScaleLibrary.scale_table(key_name)
+    key_scale = table.notes
+    scale_length = len(key_scale)
+    degree_count = len(ScaleLibrary.MODE_STEPS[ScaleLibrary.parse_key_name(key_name)[1]]) - 1
+
+    if model.states == "degree":
+        # nearest index of every degree from every index
+        degrees = np.array([table.degrees[note] for note in key_scale])
+        positions = np.arange(scale_length)
+        distance = np.abs(positions[:, None] - positions[None, :])
+        next_index = [
+            [int(np.argmin(np.where(degrees == degree % degree_count, distance[index], scale_length)))
+             for degree in range(model.state_count)]
+            for index in range(scale_length)
+        ]
+
+    current_index = scale_length // 2
+    symbols = model.iter_symbols(rng)
+    remaining = note_count
+    while remaining is None or remaining > 0:
+        yield current_index, 1
+        if remaining is not None:
+            remaining -= 1
+            if remaining == 0:
+                return
+
+        symbol = next(symbols)
+        if model.states == "degree":
+            current_index = next_index[current_index][symbol]
+        else:
+            new_index = current_index + symbol - MAX_INTERVAL
+            current_index = max(0, min(scale_length - 1, new_index))
+
+
+def iter_markov_melody(
+        model,
+        key_name="C Major",
+        tempo=120,
+        note_length_fraction=1.0,
+        note_count=None,
+        rng=None
+):
+    """
+    Yield a melody sampled from a Markov model one note at a time.
+
+    See iter_markov_indices for how the model's states move through the scale.
+
+    :param model: (MarkovMelodyModel) Trained model
+    :param key_name: (str) Name of the key to generate melody with
+    :param tempo: (int) Tempo in BPM
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :param note_count: (int) Number of notes to generate (None = never stop)
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: generator of (pitch, start, end, velocity) with times in seconds
+    """
+    events = iter_markov_indices(model, key_name, note_count, rng)
+    return music_generator.timed_notes(ScaleLibrary.scale(key_name), events, tempo, note_length_fraction)
+
+
+def generate_markov_melody(
+        model,
+        filename="markov_melody.mid",
+        key_name="C Major",
+        tempo=120,
+        instrument_program=0,
+        note_length_fraction=1.0,
+        note_count=16,
+        return_bytes=False,
+        rng=None
+):
+    """
+    Generate a melody from a Markov model and save it to a MIDI file.
+
+    :param model: (MarkovMelodyModel) Trained model
+    :param filename: (str or binary stream) Output MIDI filename or writable stream
+    :param key_name: (str) Name of the key to generate melody with
+    :param tempo: (int) Tempo in BPM
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :param note_count: (int) Number of notes to generate
+    :param return_bytes: (bool) Return the MIDI bytes instead of writing a file
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: filename, or (bytes) MIDI data if return_bytes
+    """
+    events = iter_markov_indices(model, key_name, note_count, rng)
+    notes = NoteBuffer.from_notes(
+        music_generator.tick_notes(ScaleLibrary.scale(key_name), events, note_length_fraction),
+        resolution=music_generator.TICKS_PER_BEAT,
+    )
+    return music_generator.write_notes(
+        filename, notes, tempo, instrument_program, return_bytes, "generate_markov_melody"
+    )
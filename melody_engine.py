@@ -0,0 +1,113 @@
+# melody_engine.py
+# version 0.1
+
+import numpy as np
+
+from generation_plan import generation_plan
+from scale_library import ScaleLibrary
+
+def _position_step_table(plan, note_count):
+    """
+    Step options of every position 1..note_count-1 as a padded table.
+
+    :param plan: (GenerationPlan) Compiled rule set
+    :param note_count: (int) Number of notes in each melody (the phrase length)
+    :return: (tuple) Arrays (options, counts): options[p, j] is the j-th step
+             option at position p + 1 and counts[p] the number of options
+    """
+    width = max(len(steps) for steps in plan.phase_steps)
+    phase_options = np.zeros((len(plan.phase_steps), width), dtype=np.int16)
+    for phase, steps in enumerate(plan.phase_steps):
+        phase_options[phase, :len(steps)] = steps
+    phase_counts = np.array([len(steps) for steps in plan.phase_steps])
+
+    phases = np.searchsorted(plan.phase_cutoffs(note_count), np.arange(1, note_count), side="right")
+    return phase_options[phases], phase_counts[phases]
+
+
+def generate_rule_based_indices(
+        batch_size,
+        scale_length,
+        note_count=16,
+        leap_probability=0.1,
+        max_leap_size=4,
+        contour="arch",
+        rng=None
+):
+    """
+    Generate a batch of rule-based melodies as scale indices in one pass.
+
+    Uses the same rules as generate_melody_rule_based: start in the middle of
+    the scale, step according to the contour, leap with leap_probability to any
+    non-zero offset within max_leap_size, and clamp to the scale boundaries.
+
+    :param batch_size: (int) Number of melodies
+    :param scale_length: (int) Number of notes in the scale
+    :param note_count: (int) Number of notes per melody
+    :param leap_probability: (float) Probability of occasional leaps instead of steps
+    :param max_leap_size: (int) Maximum leap size in scale degrees
+    :param contour: (str) 'arch', 'ascending', 'descending', or 'random'
+    :param rng: (int or numpy.random.Generator) Seed or random generator (default: fresh generator)
+    :return: (numpy.ndarray) int array of shape (batch_size, note_count)
+    """
+    rng = np.random.default_rng(rng)
+
+    melodies = np.empty((batch_size, note_count), dtype=np.int16)
+    if note_count == 0:
+        return melodies
+
+    # draw every random choice up front
+    plan = generation_plan(contour, leap_probability, max_leap_size, scale_length)
+    options, counts = _position_step_table(plan, note_count)
+    choices = (rng.random((batch_size, note_count - 1)) * counts).astype(np.int64)
+    steps = options[np.arange(note_count - 1), choices]
+
+    if plan.leap_steps:
+        leap_steps = np.array(plan.leap_steps, dtype=np.int16)
+        leaps = leap_steps[rng.integers(0, len(leap_steps), size=steps.shape, dtype=np.int16)]
+        leap_mask = rng.random(steps.shape) < leap_probability
+        steps = np.where(leap_mask, leaps, steps)
+
+    # the clamp depends on the previous note, so walk the positions while
+    # updating every melody at once
+    current = np.full(batch_size, scale_length // 2, dtype=np.int16)
+    melodies[:, 0] = current
+    for i in range(note_count - 1):
+        current = np.clip(current + steps[:, i], plan.lowest_index, plan.highest_index)
+        melodies[:, i + 1] = current
+
+    return melodies
+
+
+def generate_rule_based_pitches(
+        batch_size,
+        key_name="C Major",
+        note_count=16,
+        leap_probability=0.1,
+        max_leap_size=4,
+        contour="arch",
+        rng=None
+):
+    """
+    Generate a batch of rule-based melodies as MIDI pitches.
+
+    :param batch_size: (int) Number of melodies
+    :param key_name: (str) Name of the key to generate melodies with
+    :param note_count: (int) Number of notes per melody
+    :param leap_probability: (float) Probability of occasional leaps instead of steps
+    :param max_leap_size: (int) Maximum leap size in scale degrees
+    :param contour: (str) 'arch', 'ascending', 'descending', or 'random'
+    :param rng: (int or numpy.random.Generator) Seed or random generator (default: fresh generator)
+    :return: (numpy.ndarray) MIDI pitches of shape (batch_size, note_count)
+    """
+    key_scale = np.asarray(ScaleLibrary.scale(key_name), dtype=np.uint8)
+    indices = generate_rule_based_indices(
+        batch_size,
+        len(key_scale),
+        note_count=note_count,
+        leap_probability=leap_probability,
+        max_leap_size=max_leap_size,
+        contour=contour,
+        rng=rng,
+    )
+    return key_scale[indices]
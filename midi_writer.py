@@ -0,0 +1,314 @@
+# midi_writer.py
+# version 0.1
+
+import heapq
+import struct
+from collections import namedtuple
+
+# pretty_midi's default resolution (ticks per quarter note)
+DEFAULT_RESOLUTION = 220
+
+NOTE_ON = 0x90
+PROGRAM_CHANGE = 0xC0
+
+# channel pretty_midi (and General MIDI) uses for percussion
+DRUM_CHANNEL = 9
+
+# bytes buffered before a streamed track is flushed to the file
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# One instrument track: (pitch, start, end, velocity) notes in seconds (or
+# ticks), the MIDI program, whether it is a drum track and an optional track name
+Track = namedtuple("Track", ["notes", "program", "is_drum", "name"], defaults=(False, ""))
+
+
+def encode_variable_length(value):
+    """
+    Encode an integer as a MIDI variable-length quantity.
+
+    :param value: (int) Non-negative integer (delta time, length, ...)
+    :return: (bytes) 7 bits per byte, most significant first
+    """
+    if value < 0:
+        raise ValueError(f"Variable-length value must be non-negative, got {value}")
+
+    data = [value & 0x7F]
+    value >>= 7
+    while value:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(data))
+
+
+def tick_scale(tempo, resolution=DEFAULT_RESOLUTION):
+    """
+    Seconds per tick for a constant tempo, computed the same way as pretty_midi.
+
+    :param tempo: (int) Tempo in BPM
+    :param resolution: (int) Ticks per quarter note
+    :return: (float) Seconds per tick
+    """
+    return 60.0 / (tempo * resolution)
+
+
+def seconds_to_ticks(seconds, scale):
+    """
+    Convert a time in seconds to an absolute tick, rounding like pretty_midi.
+
+    :param seconds: (float) Time in seconds
+    :param scale: (float) Seconds per tick (see tick_scale)
+    :return: (int) Absolute tick
+    """
+    if seconds <= 0:
+        return 0
+    return int(round(seconds / scale))
+
+
+def check_data_byte(value, name):
+    """
+    Raise ValueError unless value fits a MIDI data byte (0-127).
+
+    :param value: (int) Program, pitch or velocity
+    :param name: (str) What the value is, for the error message
+    """
+    if not 0 <= value <= 127:
+        raise ValueError(f"MIDI {name} must be between 0 and 127, got {value}")
+
+
+def _chunk(chunk_type, data):
+    return chunk_type + struct.pack(">I", len(data)) + data
+
+
+def _meta(meta_type, data):
+    return bytes([0xFF, meta_type]) + encode_variable_length(len(data)) + data
+
+
+def _header(track_count, resolution):
+    return _chunk(b"MThd", struct.pack(">HHH", 1, track_count, resolution))
+
+
+def _timing_track(tempo, resolution):
+    """
+    Track 0: tempo and a default 4/4 time signature, as written by pretty_midi.
+    """
+    if tempo <= 0:
+        raise ValueError(f"Tempo must be positive, got {tempo}")
+    microseconds = int(6e7 / (60. / (tick_scale(tempo, resolution) * resolution)))
+    if microseconds >= 1 << 24:
+        raise ValueError(f"Tempo {tempo} is too slow for a MIDI tempo event (at least 4 BPM)")
+    data = bytearray()
+    data += b"\x00" + _meta(0x51, microseconds.to_bytes(3, "big"))
+    data += b"\x00" + _meta(0x58, bytes([4, 2, 24, 8]))
+    # end of track one tick after the last event
+    data += b"\x01" + _meta(0x2F, b"")
+    return _chunk(b"MTrk", bytes(data))
+
+
+def track_channel(index, is_drum=False):
+    """
+    MIDI channel of the index-th instrument track, assigned like pretty_midi:
+    drums on channel 9, other tracks cycling through the remaining 15.
+
+    :param index: (int) Position of the track among the instrument tracks
+    :param is_drum: (bool) Percussion track
+    :return: (int) Channel 0-15
+    """
+    if is_drum:
+        return DRUM_CHANNEL
+    channels = [channel for channel in range(16) if channel != DRUM_CHANNEL]
+    return channels[index % len(channels)]
+
+
+def notes_to_ticks(notes, scale):
+    """
+    Yield notes with their times converted from seconds to absolute ticks.
+
+    :param notes: Iterable of (pitch, start, end, velocity) with times in seconds
+    :param scale: (float) Seconds per tick (see tick_scale)
+    :return: generator of (pitch, start tick, end tick, velocity)
+    """
+    for pitch, start, end, velocity in notes:
+        yield pitch, seconds_to_ticks(start, scale), seconds_to_ticks(end, scale), velocity
+
+
+def _note_events(notes):
+    """
+    Yield absolute-tick note events for notes in ticks ordered by start time.
+
+    Only note-offs that are still pending are held back, so memory stays
+    constant for monophonic (or bounded-polyphony) streams of any length.
+    Events at the same tick are ordered by pitch and then velocity, so a
+    note-off (velocity 0) always comes before a note-on of the same pitch.
+    """
+    pending = []
+    last_start_tick = 0
+    for pitch, start_tick, end_tick, velocity in notes:
+        check_data_byte(pitch, "pitch")
+        check_data_byte(velocity, "velocity")
+        if start_tick < last_start_tick:
+            raise ValueError("Notes must be ordered by start time")
+        last_start_tick = start_tick
+
+        # nothing that arrives later can land before this note's start
+        while pending and pending[0][0] < start_tick:
+            yield heapq.heappop(pending)
+
+        heapq.heappush(pending, (start_tick, pitch, velocity))
+        heapq.heappush(pending, (end_tick, pitch, 0))
+
+    while pending:
+        yield heapq.heappop(pending)
+
+
+def _instrument_track_data(events, instrument_program, channel=0, name=""):
+    """
+    Yield the body of one instrument track in pieces, with delta times and
+    running status.
+    """
+    data = bytearray()
+    if name:
+        data += b"\x00" + _meta(0x03, name.encode("latin-1"))
+    data += b"\x00" + bytes([PROGRAM_CHANGE | channel, instrument_program])
+    running_status = PROGRAM_CHANGE | channel
+    status = NOTE_ON | channel
+
+    last_tick = 0
+    for tick, pitch, velocity in events:
+        data += encode_variable_length(tick - last_tick)
+        if status != running_status:
+            data.append(status)
+            running_status = status
+        data.append(pitch)
+        data.append(velocity)
+        last_tick = tick
+
+        if len(data) >= STREAM_CHUNK_SIZE:
+            yield bytes(data)
+            data.clear()
+
+    data += b"\x01" + _meta(0x2F, b"")
+    yield bytes(data)
+
+
+def encode_midi(notes, tempo=120, instrument_program=0, resolution=DEFAULT_RESOLUTION, ticks=False):
+    """
+    Encode notes as a Standard MIDI File without going through pretty_midi.
+
+    The output matches what pretty_midi.PrettyMIDI(initial_tempo=tempo).write()
+    produces for a single instrument holding the same notes.
+
+    :param notes: Iterable of (pitch, start, end, velocity) with times in seconds
+    :param tempo: (int) Tempo in BPM
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param resolution: (int) Ticks per quarter note
+    :param ticks: (bool) Note times are absolute ticks at resolution instead of seconds
+    :return: (bytes) MIDI file contents
+    """
+    return encode_tracks([Track(notes, instrument_program)], tempo, resolution, ticks)
+
+
+def encode_tracks(tracks, tempo=120, resolution=DEFAULT_RESOLUTION, ticks=False):
+    """
+    Encode several instrument tracks as one Standard MIDI File.
+
+    The output matches what pretty_midi writes for the same instruments, in
+    the same order: one timing track, then one track per instrument with
+    channels assigned by track_channel.
+
+    :param tracks: (list) Track tuples (notes, program, is_drum, name)
+    :param tempo: (int) Tempo in BPM
+    :param resolution: (int) Ticks per quarter note
+    :param ticks: (bool) Note times are absolute ticks at resolution instead of seconds
+    :return: (bytes) MIDI file contents
+    """
+    chunks = [_header(len(tracks) + 1, resolution), _timing_track(tempo, resolution)]
+    scale = tick_scale(tempo, resolution)
+    for index, track in enumerate(tracks):
+        track = Track(*track)
+        check_data_byte(track.program, "program")
+        notes = sorted(track.notes, key=lambda note: note[1])
+        events = _note_events(notes if ticks else notes_to_ticks(notes, scale))
+        data = b"".join(_instrument_track_data(
+            events, track.program, track_channel(index, track.is_drum), track.name
+        ))
+        chunks.append(_chunk(b"MTrk", data))
+    return b"".join(chunks)
+
+
+def write_bytes(filename, data):
+    """
+    Write MIDI bytes to a filename or to a writable binary stream.
+
+    :param filename: (str or binary stream) Output MIDI filename or stream
+    :param data: (bytes) MIDI file contents
+    :return: filename
+    """
+    if hasattr(filename, "write"):
+        filename.write(data)
+    else:
+        with open(filename, "wb") as f:
+            f.write(data)
+    return filename
+
+
+def write_midi(filename, notes, tempo=120, instrument_program=0, resolution=DEFAULT_RESOLUTION, ticks=False):
+    """
+    Encode notes and save them to a MIDI file or binary stream.
+
+    :param filename: (str or binary stream) Output MIDI filename or writable stream
+    :param notes: Iterable of (pitch, start, end, velocity) with times in seconds
+    :param tempo: (int) Tempo in BPM
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param resolution: (int) Ticks per quarter note
+    :param ticks: (bool) Note times are absolute ticks at resolution instead of seconds
+    :return: filename
+    """
+    return write_bytes(filename, encode_midi(notes, tempo, instrument_program, resolution, ticks))
+
+
+def write_midi_stream(filename, notes, tempo=120, instrument_program=0, resolution=DEFAULT_RESOLUTION,
+                      ticks=False):
+    """
+    Encode a stream of notes straight to a MIDI file without holding it in memory.
+
+    Notes are consumed lazily and must arrive ordered by start time (as the
+    iter_* generators in music_generator produce them). Stop an unbounded
+    stream with itertools.islice or a generator that returns. The track length
+    is patched in afterwards, so a stream passed in must be seekable.
+
+    :param filename: (str or seekable binary stream) Output MIDI filename or stream
+    :param notes: Iterable of (pitch, start, end, velocity) with times in seconds
+    :param tempo: (int) Tempo in BPM
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param resolution: (int) Ticks per quarter note
+    :param ticks: (bool) Note times are absolute ticks at resolution instead of seconds
+    :return: filename
+    """
+    check_data_byte(instrument_program, "program")
+    timing_track = _timing_track(tempo, resolution)
+    if not ticks:
+        notes = notes_to_ticks(notes, tick_scale(tempo, resolution))
+    events = _note_events(notes)
+
+    f = filename if hasattr(filename, "write") else open(filename, "wb")
+    try:
+        f.write(_header(2, resolution) + timing_track)
+
+        f.write(b"MTrk")
+        length_position = f.tell()
+        f.write(struct.pack(">I", 0))
+
+        length = 0
+        for data in _instrument_track_data(events, instrument_program):
+            f.write(data)
+            length += len(data)
+
+        end_position = f.tell()
+        f.seek(length_position)
+        f.write(struct.pack(">I", length))
+        f.seek(end_position)
+    finally:
+        if f is not filename:
+            f.close()
+
+    return filename
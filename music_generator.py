@@ -1,10 +1,22 @@
 # music_generator.py
 # version 0.1
 
-import pretty_midi
+import contextlib
+import contextvars
+import hashlib
+import io
+import itertools
+import os
 import random
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
 
+import midi_writer
 import scale_library
+from generation_plan import generation_plan
+from note_buffer import NoteBuffer
 from scale_library import ScaleLibrary
 
 INSTRUMENTS = {
@@ -23,83 +35,389 @@ NOTE_LENGTHS = {
     "Sixteenth": 0.25
 }
 
-KEY_SCALES_MAJOR = ScaleLibrary.major_scales()
+# "native" writes MIDI bytes directly, "pretty_midi" goes through pretty_midi/mido
+MIDI_BACKEND = "native"
+
+# Bump whenever a change makes the generators give different output for the
+# same parameters (invalidates output_cache entries)
+GENERATOR_VERSION = 2
+
+DEFAULT_VELOCITY = 100
+
+# Resolution of the generators' timeline (ticks per quarter note). Note
+# times are kept as integer ticks and only turned into seconds on request.
+TICKS_PER_BEAT = midi_writer.DEFAULT_RESOLUTION
+
+# contour phrase length for unbounded rule-based melodies
+DEFAULT_PHRASE_LENGTH = 16
+
+
+def resolve_rng(rng=None):
+    """
+    Turn a seed or random generator argument into something with choice()/random().
+
+    :param rng: None for the shared module-level RNG, an int seed, or a random.Random
+    :return: random.Random (or the random module when rng is None)
+    """
+    if rng is None:
+        return random
+    if isinstance(rng, random.Random):
+        return rng
+    return random.Random(rng)
+
+
+def derive_seed(seed, index):
+    """
+    Split a base seed into an independent seed for one job of a batch.
+
+    The result only depends on (seed, index), so a batch produces the same
+    output however it is divided between workers.
+
+    :param seed: (int or str) Base seed of the batch
+    :param index: (int) Position of the job in the batch
+    :return: (int) 64-bit seed for the job
+    """
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def __getattr__(name):
+    # KEY_SCALES_MAJOR is built on first use so importing this module stays cheap
+    if name == "KEY_SCALES_MAJOR":
+        return ScaleLibrary.major_scales()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# One timed phase of a generator call: 'compose', 'build_notes' (pretty_midi
+# backend only), 'serialize' or 'write'. cpu_time is for the calling thread and
+# peak_bytes is the most memory (traced by tracemalloc) the phase allocated on
+# top of what was live when it started.
+PhaseTiming = namedtuple(
+    "PhaseTiming",
+    ["generator", "phase", "wall_time", "cpu_time", "peak_bytes"]
+)
+
+# callbacks of the profile_phases blocks active in the current thread or task
+_phase_callbacks = contextvars.ContextVar("phase_callbacks", default=())
+_NOT_PROFILING = contextlib.nullcontext()
+
+# profile_phases blocks active in any thread, and whether they turned tracemalloc on
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+class _PhaseTimer:
+    """
+    Context manager that measures one phase and reports it to every callback.
+    """
+
+    def __init__(self, generator, phase, callbacks):
+        self.generator = generator
+        self.phase = phase
+        self.callbacks = callbacks
+
+    def __enter__(self):
+        import tracemalloc
+        self.traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        import tracemalloc
+        timing = PhaseTiming(
+            self.generator,
+            self.phase,
+            time.perf_counter() - self.wall,
+            time.thread_time() - self.cpu,
+            max(0, tracemalloc.get_traced_memory()[1] - self.traced),
+        )
+        for callback in self.callbacks:
+            callback(timing)
+        return False
+
+
+def _phase(generator, phase):
+    # returns a shared no-op context when nobody is listening
+    callbacks = _phase_callbacks.get()
+    if not callbacks:
+        return _NOT_PROFILING
+    return _PhaseTimer(generator, phase, callbacks)
+
+
+@contextlib.contextmanager
+def profile_phases(callback=None):
+    """
+    Report the phases of every generator call made inside the with block.
+
+    Only calls from the same thread (or asyncio task) are reported. Profiling
+    is off unless a profile_phases block is active; while one is, tracemalloc
+    traces allocations, which slows allocation-heavy phases down noticeably.
+    Allocations of other threads running at the same time count towards
+    peak_bytes too.
+
+        with profile_phases(print):
+            generate_melody_rule_based(note_count=1000)
+
+    :param callback: Called with a PhaseTiming per phase (default: collect only)
+    :return: (list) Context value collecting every PhaseTiming reported in the block
+    """
+    timings = []
+
+    def record(timing):
+        timings.append(timing)
+        if callback is not None:
+            callback(timing)
+
+    _start_tracing()
+    token = _phase_callbacks.set(_phase_callbacks.get() + (record,))
+    try:
+        yield timings
+    finally:
+        _phase_callbacks.reset(token)
+        _stop_tracing()
+
+
+def _start_tracing():
+    # tracemalloc (and pickle with it) is slow to import, so only load it for profiling
+    import tracemalloc
+
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _started_tracing = not tracemalloc.is_tracing()
+            if _started_tracing:
+                tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    # leaves tracemalloc on if something else had started it
+    import tracemalloc
+
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+
+
+def _encode_notes(notes, tempo, instrument_program, generator=None):
+    """
+    Encode a list of (pitch, start, end, velocity) notes as MIDI file bytes.
+
+    :param notes: (NoteBuffer or list) Notes with start/end times in seconds, or a NoteBuffer in ticks
+    :param tempo: (int) Tempo in BPM
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param generator: (str) Name of the calling generator, for profiling
+    :return: (bytes) MIDI file contents
+    """
+    if MIDI_BACKEND == "pretty_midi":
+        with _phase(generator, "build_notes"):
+            if not isinstance(notes, NoteBuffer):
+                notes = NoteBuffer.from_notes(notes)
+            pm = notes.to_pretty_midi(tempo, instrument_program)
+
+        with _phase(generator, "serialize"):
+            buffer = io.BytesIO()
+            pm.write(buffer)
+            return buffer.getvalue()
+
+    with _phase(generator, "serialize"):
+        resolution = getattr(notes, "resolution", None)
+        if resolution is not None:
+            return midi_writer.encode_midi(notes, tempo, instrument_program, resolution, ticks=True)
+        return midi_writer.encode_midi(notes, tempo, instrument_program)
+
+
+def write_notes(filename, notes, tempo, instrument_program, return_bytes=False, generator=None):
+    """
+    Save notes to a MIDI file or binary stream, or return them as bytes.
+
+    :param filename: (str or binary stream) Output MIDI filename or writable stream
+    :param notes: (NoteBuffer or list) Notes with start/end times in seconds, or a NoteBuffer in ticks
+    :param tempo: (int) Tempo in BPM
+    :param instrument_program: (int) MIDI program number (instrument)
+    :param return_bytes: (bool) Return the MIDI bytes instead of writing them
+    :param generator: (str) Name of the calling generator, for profiling
+    :return: (bytes) MIDI bytes if return_bytes, else filename
+    """
+    data = _encode_notes(notes, tempo, instrument_program, generator)
+    if return_bytes:
+        return data
+    with _phase(generator, "write"):
+        return midi_writer.write_bytes(filename, data)
+
+
+def iter_scale_indices(scale_length, repeat=False):
+    """
+    Yield the scale indices of an ascending and descending scale with their
+    lengths in beats, independent of key and tempo.
+
+    :param scale_length: (int) Number of notes in the scale
+    :param repeat: (bool) Keep playing the scale up and down forever
+    :return: generator of (scale index, beats)
+    """
+    while True:
+        # Go up the scale
+        for index in range(scale_length - 1):
+            yield index, 1
+
+        # Tonic note (top)
+        yield scale_length - 1, 2
+
+        # Descending (omit duplicate tonic at start)
+        for index in range(scale_length - 2, 0, -1):
+            yield index, 1
+
+        # Tonic note (end)
+        yield 0, 2
+
+        if not repeat:
+            return
+
+
+def beat_ticks(note_length_fraction=1.0, resolution=TICKS_PER_BEAT):
+    """
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :param resolution: (int) Ticks per quarter note
+    :return: (float) Length of one beat in ticks (whole for the NOTE_LENGTHS)
+    """
+    return resolution * note_length_fraction
+
+
+def tick_notes(key_scale, events, note_length_fraction=1.0, resolution=TICKS_PER_BEAT):
+    """
+    Turn (scale index, beats) events into notes on an integer tick timeline.
+
+    Positions are summed in whole beats and each one rounded to a tick on
+    its own, so timing stays exact however many notes there are, also for
+    note lengths that are not a whole number of ticks.
+
+    :param key_scale: (list) MIDI notes of the scale
+    :param events: Iterable of (scale index, beats)
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :param resolution: (int) Ticks per quarter note
+    :return: generator of (pitch, start, end, velocity) with times in ticks
+    """
+    ticks_per_beat = beat_ticks(note_length_fraction, resolution)
+
+    position = 0
+    start = 0
+    for index, beats in events:
+        position += beats
+        end = round(position * ticks_per_beat)
+        yield (key_scale[index], start, end, DEFAULT_VELOCITY)
+        start = end
+
+
+def timed_notes(key_scale, events, tempo, note_length_fraction=1.0):
+    """
+    Turn (scale index, beats) events into notes in seconds.
+
+    Times are laid out in ticks (see tick_notes) and each one converted to
+    seconds on its own, so they do not drift.
+
+    :param key_scale: (list) MIDI notes of the scale
+    :param events: Iterable of (scale index, beats)
+    :param tempo: (int) Tempo in BPM
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :return: generator of (pitch, start, end, velocity) with times in seconds
+    """
+    seconds_per_tick = midi_writer.tick_scale(tempo, TICKS_PER_BEAT)
+    for pitch, start, end, velocity in tick_notes(key_scale, events, note_length_fraction):
+        yield (pitch, start * seconds_per_tick, end * seconds_per_tick, velocity)
+
+
+def iter_scale(
+        key_name="C Major",
+        tempo=120,
+        note_length_fraction=1.0,
+        repeat=False
+):
+    """
+    Yield the notes of an ascending and descending scale one at a time.
+
+    :param key_name: (str) name of the key to generate scale with
+    :param tempo: (int) Tempo in BPM
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :param repeat: (bool) Keep playing the scale up and down forever
+    :return: generator of (pitch, start, end, velocity) with times in seconds
+    """
+
+    key_scale = ScaleLibrary.scale(key_name)
+    return timed_notes(key_scale, iter_scale_indices(len(key_scale), repeat), tempo, note_length_fraction)
+
 
 def generate_scale(
         filename="scale.mid",
         key_name="C Major",
         tempo=120,
         note_length_fraction=1.0,
-        instrument_program=0
+        instrument_program=0,
+        return_bytes=False
 ):
     """
     Generate an ascending and descending scale and save it to a MIDI file.
 
-    :param filename: (str) Output MIDI filename
+    :param filename: (str or binary stream) Output MIDI filename or writable stream
     :param key_name: (str) name of the key to generate scale with
     :param tempo: (int) Tempo in BPM
     :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
     :param instrument_program: (int) MIDI program number (instrument)
-    :return:
+    :param return_bytes: (bool) Return the MIDI bytes instead of writing a file
+    :return: filename, or (bytes) MIDI data if return_bytes
     """
 
-    key_scale = ScaleLibrary.major_scales()[key_name]
+    with _phase("generate_scale", "compose"):
+        key_scale = ScaleLibrary.scale(key_name)
+        events = iter_scale_indices(len(key_scale))
+        notes = NoteBuffer.from_notes(
+            tick_notes(key_scale, events, note_length_fraction), resolution=TICKS_PER_BEAT
+        )
 
-    quarter_duration = 60 / tempo * note_length_fraction
+    return write_notes(filename, notes, tempo, instrument_program, return_bytes, "generate_scale")
 
-    pm = pretty_midi.PrettyMIDI(initial_tempo=tempo)
-    instrument = pretty_midi.Instrument(program=instrument_program)
 
-    # Go up the scale
-    start_time = 0
-    for note_number in key_scale[:-1]:
-        note = pretty_midi.Note(
-            velocity=100,
-            pitch=note_number,
-            start=start_time,
-            end=start_time + quarter_duration
-        )
-        instrument.notes.append(note)
-        start_time = start_time + quarter_duration
-
-    # Tonic note (top)
-    note = pretty_midi.Note(
-        velocity=100,
-        pitch=key_scale[-1],
-        start=start_time,
-        end=start_time + quarter_duration * 2
-    )
-    instrument.notes.append(note)
-    start_time = start_time + quarter_duration * 2
+def iter_random_indices(scale_length, note_count=None, rng=None):
+    """
+    Yield random scale indices with their lengths in beats.
 
-    # Descending (omit duplicate tonic at start)
-    descending_scale = list(reversed(key_scale))
-    descending_scale.pop(0)
+    :param scale_length: (int) Number of notes in the scale
+    :param note_count: (int) Number of notes to generate (None = never stop)
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: generator of (scale index, beats)
+    """
+    rng = resolve_rng(rng)
+    indices = range(scale_length)
 
+    for _ in itertools.count() if note_count is None else range(note_count):
+        yield rng.choice(indices), 1
 
-    for note_number in descending_scale[:-1]:
-        note = pretty_midi.Note(
-            velocity=100,
-            pitch=note_number,
-            start=start_time,
-            end=start_time + quarter_duration
-        )
-        instrument.notes.append(note)
-        start_time = start_time + quarter_duration
-
-    # Tonic note (end)
-    note = pretty_midi.Note(
-        velocity=100,
-        pitch=descending_scale[-1],
-        start=start_time,
-        end=start_time + quarter_duration * 2
-    )
-    instrument.notes.append(note)
 
-    pm.instruments.append(instrument)
-    pm.write(filename)
+def iter_random_melody(
+        key_name="C Major",
+        tempo=120,
+        note_count=None,
+        note_length_fraction=1.0,
+        rng=None
+):
+    """
+    Yield random notes from the key scale one at a time.
 
-    return filename
+    :param key_name: (str) Name of the key to generate melody with
+    :param tempo:  (int) Tempo in BPM
+    :param note_count: (int) Number of notes to generate (None = never stop)
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: generator of (pitch, start, end, velocity) with times in seconds
+    """
+
+    key_scale = ScaleLibrary.scale(key_name)
+    events = iter_random_indices(len(key_scale), note_count, rng)
+    return timed_notes(key_scale, events, tempo, note_length_fraction)
 
 
 def generate_random_melody(
@@ -108,43 +426,119 @@ def generate_random_melody(
         tempo=120,
         note_count=16,
         note_length_fraction=1.0,
-        instrument_program=0
+        instrument_program=0,
+        return_bytes=False,
+        rng=None
 ):
     """
     Generate a random melody with the specified key scale and tempo and save it to a MIDI file.
 
-    :param filename: (str) Output MIDI filename
+    :param filename: (str or binary stream) Output MIDI filename or writable stream
     :param key_name: (str) Name of the key to generate melody with
     :param tempo:  (int) Tempo in BPM
     :param note_count: (int) Number of notes to generate
     :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
     :param instrument_program: (int) MIDI program number (instrument)
-    :return: filename: (str) MIDI filename
+    :param return_bytes: (bool) Return the MIDI bytes instead of writing a file
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: filename: (str) MIDI filename, or (bytes) MIDI data if return_bytes
     """
 
-    key_scale = ScaleLibrary.major_scales()[key_name]
+    with _phase("generate_random_melody", "compose"):
+        key_scale = ScaleLibrary.scale(key_name)
+        events = iter_random_indices(len(key_scale), note_count, rng)
+        notes = NoteBuffer.from_notes(
+            tick_notes(key_scale, events, note_length_fraction), resolution=TICKS_PER_BEAT
+        )
 
-    quarter_duration = 60 / tempo * note_length_fraction
+    return write_notes(filename, notes, tempo, instrument_program, return_bytes, "generate_random_melody")
 
-    pm = pretty_midi.PrettyMIDI(initial_tempo=tempo)
-    instrument = pretty_midi.Instrument(program=instrument_program)
 
-    start_time = 0
-    for _ in range(note_count):
-        note_number = random.choice(key_scale)
-        note = pretty_midi.Note(
-            velocity=100,
-            pitch=note_number,
-            start=start_time,
-            end=start_time + quarter_duration,
-        )
-        instrument.notes.append(note)
-        start_time = start_time + quarter_duration
+def iter_rule_based_indices(
+        scale_length,
+        note_count=None,
+        leap_probability=0.1,
+        max_leap_size=4,
+        contour="arch",
+        phrase_length=None,
+        rng=None
+):
+    """
+    Yield the scale indices of a rule-based melody with their lengths in beats.
+
+    :param scale_length: (int) Number of notes in the scale
+    :param note_count: (int) Number of notes to generate (None = never stop)
+    :param leap_probability: (float) Probability of occasional leaps instead of steps
+    :param max_leap_size: (int) Maximum leap size in scale degrees
+    :param contour: (str) 'arch', 'ascending', 'descending', or 'random'
+    :param phrase_length: (int) Notes per contour phrase (default: note_count, or 16 if unbounded)
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: generator of (scale index, beats)
+    """
+
+    rng = resolve_rng(rng)
+
+    if phrase_length is None:
+        phrase_length = DEFAULT_PHRASE_LENGTH if note_count is None else note_count
+
+    plan = generation_plan(contour, leap_probability, max_leap_size, scale_length)
+    phase_steps = plan.phase_steps
+    cutoffs = plan.phase_cutoffs(phrase_length)
+    leap_steps = plan.leap_steps
+    lowest = plan.lowest_index
+    highest = plan.highest_index
+
+    # start on tonic
+    current_index = scale_length // 2
+    yield current_index, 1
+
+    for i in itertools.count(1) if note_count is None else range(1, note_count):
+        if rng.random() < leap_probability:
+            step = rng.choice(leap_steps)
+        else:
+            step = rng.choice(phase_steps[bisect_right(cutoffs, i % phrase_length)])
 
-    pm.instruments.append(instrument)
-    pm.write(filename)
+        # Clamp to scale boundaries
+        current_index = max(lowest, min(highest, current_index + step))
+
+        yield current_index, 1
+
+
+def iter_melody_rule_based(
+        key_name="C Major",
+        tempo=120,
+        note_length_fraction=1.0,
+        note_count=None,
+        leap_probability=0.1,
+        max_leap_size=4,
+        contour="arch",
+        phrase_length=None,
+        rng=None
+):
+    """
+    Yield a rule-based melody (stepwise motion and occasional leaps) one note at a time.
+
+    The contour is applied per phrase: an unbounded 'arch' melody rises and
+    falls every phrase_length notes.
+
+    :param key_name: (str) Name of the key to generate melody with
+    :param tempo: (int) Tempo in BPM
+    :param note_length_fraction: (float) Multiplier for note duration (1.0 = quarter note)
+    :param note_count: (int) Number of notes to generate (None = never stop)
+    :param leap_probability: (float) Probability of occasional leaps instead of steps
+    :param max_leap_size: (int) Maximum leap size in scale degrees
+    :param contour: (str) 'arch', 'ascending', 'descending', or 'random'
+    :param phrase_length: (int) Notes per contour phrase (default: note_count, or 16 if unbounded)
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: generator of (pitch, start, end, velocity) with times in seconds
+    """
+
+    key_scale = ScaleLibrary.scale(key_name)
+    events = iter_rule_based_indices(
+        len(key_scale), note_count, leap_probability, max_leap_size, contour, phrase_length, rng
+    )
+    return timed_notes(key_scale, events, tempo, note_length_fraction)
 
-    return filename
 
 def generate_melody_rule_based(
         filename=None,
@@ -155,12 +549,14 @@ def generate_melody_rule_based(
         note_count=16,
         leap_probability=0.1,
         max_leap_size=4,
-        contour="arch"
+        contour="arch",
+        return_bytes=False,
+        rng=None
 ):
     """
     Generate a melody in the chosen key using stepwise motion and occasional leaps
 
-    :param filename: (str) MIDI filename
+    :param filename: (str or binary stream) MIDI filename or writable stream
     :param key_name: (str) Name of the key to generate melody with
     :param tempo: (int) Tempo in BPM
     :param instrument_program: (int) MIDI program number (instrument)
@@ -169,68 +565,132 @@ def generate_melody_rule_based(
     :param leap_probability: (float) Probability of occasional leaps instead of steps
     :param max_leap_size: (int) Maximum leap size in scale degrees
     :param contour: (str) 'arch', 'ascending', 'descending', or 'random'
-    :return: (str) Filename generated MIDI file
+    :param return_bytes: (bool) Return the MIDI bytes instead of writing a file
+    :param rng: (int or random.Random) Seed or random generator (default: module RNG)
+    :return: (str) Filename generated MIDI file, or (bytes) MIDI data if return_bytes
     """
 
-    key_scale = ScaleLibrary.major_scales()[key_name]
-    scale_length = len(key_scale)
+    with _phase("generate_melody_rule_based", "compose"):
+        key_scale = ScaleLibrary.scale(key_name)
+        events = iter_rule_based_indices(
+            len(key_scale),
+            note_count=note_count,
+            leap_probability=leap_probability,
+            max_leap_size=max_leap_size,
+            contour=contour,
+            rng=rng,
+        )
+        notes = NoteBuffer.from_notes(
+            tick_notes(key_scale, events, note_length_fraction), resolution=TICKS_PER_BEAT
+        )
 
-    # start on tonic
-    current_index = scale_length // 2
-    melody_indices = [current_index]
-
-    for i in range(1, note_count):
-        # Decide contour direction
-        if contour == "arch":
-            if i < note_count / 2:
-                step_options = [1, 2]
-            else:
-                step_options = [-2, -1]
-        elif contour == "ascending":
-            step_options = [1, 2]
-        elif contour == "descending":
-            step_options = [-2, -1]
-        else:
-            step_options = [-2, -1, 0, 1, 2]
+    if filename is None:
+        filename = f"rule_based_melody_{key_name.replace(' ', '_')}.mid"
 
-        if random.random() < leap_probability:
-            step = random.choice(
-                [s for s in range(-max_leap_size, max_leap_size + 1) if s != 0]
-            )
-        else:
-            step = random.choice(step_options)
+    return write_notes(
+        filename, notes, tempo, instrument_program, return_bytes, "generate_melody_rule_based"
+    )
 
-        new_index = current_index + step
 
-        # Clamp to scale boundaries
-        next_index = max(0, min(scale_length - 1, new_index))
+# filename of a batch job that does not name its own output
+BATCH_FILENAME = "batch_melody_{index:05d}.mid"
+
+# batch job field -> generate_melody_rule_based argument
+BATCH_JOB_FIELDS = {
+    "filename": "filename",
+    "key": "key_name",
+    "tempo": "tempo",
+    "instrument": "instrument_program",
+    "note_length": "note_length_fraction",
+    "note_count": "note_count",
+    "leap_probability": "leap_probability",
+    "max_leap_size": "max_leap_size",
+    "contour": "contour",
+    "seed": "rng",
+}
 
-        melody_indices.append(next_index)
-        current_index = next_index
 
-    # generate MIDI
-    quarter_duration = 60 / tempo * note_length_fraction
+def _batch_job_arguments(job):
+    """
+    Translate a batch job dictionary into generate_melody_rule_based arguments.
 
-    pm = pretty_midi.PrettyMIDI(initial_tempo=tempo)
-    instrument = pretty_midi.Instrument(program=instrument_program)
+    Instruments and note lengths may be given by name (see INSTRUMENTS and
+    NOTE_LENGTHS) or by value.
+    """
+    unknown = set(job) - set(BATCH_JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown batch job fields: {', '.join(sorted(unknown))}")
 
-    start_time = 0
-    for idx in melody_indices:
-        note_number = key_scale[idx]
-        note = pretty_midi.Note(
-            velocity=100,
-            pitch=note_number,
-            start=start_time,
-            end=start_time + quarter_duration
-        )
-        instrument.notes.append(note)
-        start_time = start_time + quarter_duration
+    arguments = {BATCH_JOB_FIELDS[field]: value for field, value in job.items()}
 
-    pm.instruments.append(instrument)
+    instrument = arguments.get("instrument_program")
+    if isinstance(instrument, str):
+        arguments["instrument_program"] = INSTRUMENTS[instrument]
 
-    if filename is None:
-        filename = f"rule_based_melody_{key_name.replace(' ', '_')}.mid"
+    note_length = arguments.get("note_length_fraction")
+    if isinstance(note_length, str):
+        arguments["note_length_fraction"] = NOTE_LENGTHS[note_length]
+
+    return arguments
 
-    pm.write(filename)
-    return filename
 
+def _run_batch_job(job):
+    """
+    Run one batch job, returning its result instead of raising.
+    """
+    try:
+        filename = generate_melody_rule_based(**_batch_job_arguments(job))
+        return {"filename": filename, "error": None}
+    except Exception as e:
+        return {"filename": job.get("filename"), "error": f"{type(e).__name__}: {e}"}
+
+
+def _init_batch_worker():
+    # forked workers inherit the parent's RNG state; give unseeded jobs their own
+    random.seed()
+
+
+def generate_batch(jobs, workers=None, chunksize=None, seed=None):
+    """
+    Generate many rule-based melodies in parallel over a process pool.
+
+    Each job is a dictionary with any of the keys 'filename', 'key', 'tempo',
+    'instrument', 'note_length', 'note_count', 'leap_probability',
+    'max_leap_size', 'contour' and 'seed'. Missing keys use the
+    generate_melody_rule_based defaults, except that a job without a
+    'filename' is written to BATCH_FILENAME with its position in the batch,
+    so no two jobs share a file. A failing job is reported in its result and
+    does not stop the rest of the batch.
+
+    With a batch seed, every job without its own 'seed' gets one derived from
+    the batch seed and its position, so the output is bit-identical however
+    many workers run it.
+
+    :param jobs: (list) Job dictionaries
+    :param workers: (int) Number of worker processes (default: CPU count)
+    :param chunksize: (int) Jobs sent to a worker at a time (default: spread ~4 chunks per worker)
+    :param seed: (int) Base seed to split into per-job seeds
+    :return: (list) One {'filename': str, 'error': str or None} per job, in job order
+    """
+    jobs = [
+        job if "filename" in job else dict(job, filename=BATCH_FILENAME.format(index=index))
+        for index, job in enumerate(jobs)
+    ]
+    if seed is not None:
+        jobs = [
+            job if "seed" in job else dict(job, seed=derive_seed(seed, index))
+            for index, job in enumerate(jobs)
+        ]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(jobs) // (workers * 4))
+
+    if workers <= 1 or len(jobs) <= 1:
+        return [_run_batch_job(job) for job in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as executor:
+        return list(executor.map(_run_batch_job, jobs, chunksize=chunksize))
@@ -0,0 +1,345 @@
+# music_server.py
+# version 0.1
+#
+# HTTP/1.1 front end for the generators. Connections are handled on an
+# asyncio event loop; generation runs on a bounded process pool and the MIDI
+# bytes are returned directly.
+#
+#   python music_server.py --port 8000
+#   curl -o melody.mid "http://127.0.0.1:8000/rule-based?key=D+Dorian&note_count=32&seed=7"
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import music_generator
+from generation_plan import CONTOURS
+from music_generator import INSTRUMENTS, NOTE_LENGTHS
+from scale_library import ScaleLibrary
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+# requests admitted per worker (running plus queued) before answering 429
+QUEUE_PER_WORKER = 4
+
+# seconds an idle keep-alive connection stays open
+KEEP_ALIVE_TIMEOUT = 15
+
+MIN_TEMPO = 4
+MAX_TEMPO = 1000
+MAX_NOTE_COUNT = 100000
+# longest note_length in beats (four whole notes)
+MAX_NOTE_LENGTH = 16.0
+MAX_HEADER_COUNT = 100
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    414: "URI Too Long",
+    429: "Too Many Requests",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+# endpoint -> (generator function name, query parameters it accepts)
+ENDPOINTS = {
+    "/scale": ("generate_scale", ("key", "tempo", "instrument", "note_length")),
+    "/random": ("generate_random_melody", ("key", "tempo", "instrument", "note_length", "note_count", "seed")),
+    "/rule-based": ("generate_melody_rule_based", (
+        "key", "tempo", "instrument", "note_length", "note_count", "seed",
+        "leap_probability", "max_leap_size", "contour",
+    )),
+}
+
+
+def _instrument(value):
+    return INSTRUMENTS[value] if value in INSTRUMENTS else int(value)
+
+
+def _note_length(value):
+    return NOTE_LENGTHS[value] if value in NOTE_LENGTHS else float(value)
+
+
+def _key(value):
+    ScaleLibrary.parse_key_name(value)
+    return value
+
+
+def _contour(value):
+    if value not in CONTOURS:
+        raise ValueError(f"unknown contour {value!r}")
+    return value
+
+
+# query parameter -> parser of its string value
+QUERY_PARSERS = {
+    "key": _key,
+    "tempo": int,
+    "instrument": _instrument,
+    "note_length": _note_length,
+    "note_count": int,
+    "seed": int,
+    "leap_probability": float,
+    "max_leap_size": int,
+    "contour": _contour,
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or REASONS[status])
+        self.status = status
+
+
+def parse_query(path, query):
+    """
+    Validate the query string of an endpoint and turn it into generator arguments.
+
+    :param path: (str) Endpoint path, e.g. '/random'
+    :param query: (str) Raw query string
+    :return: (tuple) (generator function name, keyword arguments)
+    """
+    if path not in ENDPOINTS:
+        raise HTTPError(404)
+    function_name, accepted = ENDPOINTS[path]
+
+    arguments = {}
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        if name not in accepted:
+            raise HTTPError(400, f"Unknown parameter for {path}: {name}")
+        try:
+            value = QUERY_PARSERS[name](value)
+        except (KeyError, ValueError) as e:
+            raise HTTPError(400, f"Bad value for {name}: {e}")
+        arguments[music_generator.BATCH_JOB_FIELDS[name]] = value
+
+    # the tempo meta event holds at most 2**24 - 1 microseconds per beat
+    if not MIN_TEMPO <= arguments.get("tempo", 120) <= MAX_TEMPO:
+        raise HTTPError(400, f"tempo must be between {MIN_TEMPO} and {MAX_TEMPO}")
+    if not 0 <= arguments.get("instrument_program", 0) <= 127:
+        raise HTTPError(400, "instrument must be between 0 and 127")
+    if not 0 <= arguments.get("note_count", 0) <= MAX_NOTE_COUNT:
+        raise HTTPError(400, f"note_count must be between 0 and {MAX_NOTE_COUNT}")
+    # these comparisons are also False for nan
+    if not 0 < arguments.get("note_length_fraction", 1.0) <= MAX_NOTE_LENGTH:
+        raise HTTPError(400, f"note_length must be positive and at most {MAX_NOTE_LENGTH:g}")
+    if not 0 <= arguments.get("leap_probability", 0.0) <= 1:
+        raise HTTPError(400, "leap_probability must be between 0 and 1")
+    if "max_leap_size" in arguments:
+        scale_length = len(ScaleLibrary.scale(arguments.get("key_name", "C Major")))
+        if not 1 <= arguments["max_leap_size"] <= scale_length:
+            raise HTTPError(400, f"max_leap_size must be between 1 and {scale_length}")
+
+    return function_name, arguments
+
+
+def _generate(function_name, arguments):
+    """
+    Worker: run one generator and return its MIDI bytes.
+    """
+    generate = getattr(music_generator, function_name)
+    return generate(return_bytes=True, **arguments)
+
+
+def _init_worker():
+    # forked workers inherit the parent's RNG state; give unseeded requests their own
+    music_generator.random.seed()
+
+
+class MusicServer:
+    """
+    asyncio HTTP/1.1 server for GET /scale, /random and /rule-based.
+
+    Connections stay open between requests unless the client asks for
+    'Connection: close' (or speaks HTTP/1.0 without keep-alive). At most
+    workers * QUEUE_PER_WORKER generations are admitted at a time; requests
+    beyond that get 429 straight away instead of piling up.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_pending=None):
+        """
+        :param host: (str) Interface to listen on
+        :param port: (int) TCP port (0 = pick a free one)
+        :param workers: (int) Number of worker processes (default: CPU count)
+        :param max_pending: (int) Generations admitted at once (default: workers * QUEUE_PER_WORKER)
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * QUEUE_PER_WORKER
+        self.pending = 0
+        self.executor = None
+        self.server = None
+        self._connections = {}     # writer -> handler task
+        self.counts = {"requests": 0, "rejected": 0, "errors": 0}
+
+    async def start(self):
+        # forked workers would inherit open client sockets and keep them from
+        # closing, so start them from a clean forkserver process instead
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["music_generator"])
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context, initializer=_init_worker
+        )
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Serving on http://{self.host}:{self.port} with {self.workers} workers")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        # idle keep-alive connections would otherwise wait out their timeout
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*self._connections.values(), return_exceptions=True)
+        await self.server.wait_closed()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def _read_line(self, reader, too_long_status):
+        """
+        :param too_long_status: (int) Status to answer when the line exceeds the reader's limit
+        :return: (bytes) The line, empty when the client closed
+        """
+        try:
+            return await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise HTTPError(too_long_status)
+
+    async def _read_request(self, reader):
+        """
+        :return: (tuple) (method, target, version, headers), or None when the client closed
+        """
+        request_line = await self._read_line(reader, 414)
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await self._read_line(reader, 431)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADER_COUNT:
+                raise HTTPError(400, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        # requests carry no body we use, but it has to be consumed to keep the connection in sync
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "Bad Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Bad Content-Length")
+        if length:
+            await reader.readexactly(length)
+
+        return method, target, version, headers
+
+    async def _respond(self, method, target):
+        """
+        :return: (tuple) (status, content type, body)
+        """
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(405)
+        url = urlsplit(target)
+        function_name, arguments = parse_query(url.path, url.query)
+
+        if self.pending >= self.max_pending:
+            self.counts["rejected"] += 1
+            raise HTTPError(429, "Server busy, try again")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self.executor, _generate, function_name, arguments)
+        finally:
+            self.pending -= 1
+        return 200, "audio/midi", data
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except HTTPError as e:
+                    await self._write_response(writer, e.status, str(e), "GET", False)
+                    return
+                if request is None:
+                    return
+                method, target, version, headers = request
+                self.counts["requests"] += 1
+
+                connection = headers.get("connection", "").lower()
+                if version == "HTTP/1.0":
+                    keep_alive = connection == "keep-alive"
+                else:
+                    keep_alive = connection != "close"
+
+                try:
+                    status, content_type, body = await self._respond(method, target)
+                except HTTPError as e:
+                    status, content_type, body = e.status, "text/plain", (str(e) + "\n").encode()
+                except Exception as e:
+                    self.counts["errors"] += 1
+                    status, content_type, body = 500, "text/plain", f"{type(e).__name__}: {e}\n".encode()
+
+                await self._write_response(writer, status, body, method, keep_alive, content_type)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _write_response(self, writer, status, body, method, keep_alive, content_type="text/plain"):
+        if isinstance(body, str):
+            body = (body + "\n").encode()
+        head = [
+            f"HTTP/1.1 {status} {REASONS[status]}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 429:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        if method != "HEAD":
+            writer.write(body)
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the music generators over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="generations admitted at once before answering 429")
+    args = parser.parse_args()
+
+    server = MusicServer(args.host, args.port, args.workers, args.max_pending)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# note_buffer.py
+# version 0.1
+
+from array import array
+
+DEFAULT_CAPACITY = 64
+
+
+class NoteBuffer:
+    """
+    Growable structure-of-arrays store for generated notes.
+
+    Pitch and velocity are kept as bytes and start and end as doubles (or
+    64-bit integers on a tick timeline), in typed arrays that double their
+    capacity when full: about 18 bytes per note instead of a Python object
+    each. Iterating yields the usual (pitch, start, end, velocity) tuples,
+    so a buffer can be passed anywhere a list of notes is accepted.
+
+    A buffer with a resolution holds times as absolute ticks at that many
+    ticks per quarter note; the MIDI writer takes those as they are, and
+    to_seconds() gives the times in seconds for a tempo.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, resolution=None):
+        """
+        :param capacity: (int) Number of notes to make room for up front
+        :param resolution: (int) Ticks per quarter note of integer tick times, or None for seconds
+        """
+        capacity = max(1, capacity)
+        time_type = "d" if resolution is None else "q"
+        self.resolution = resolution
+        self._length = 0
+        self._pitches = array("B", bytes(capacity))
+        self._velocities = array("B", bytes(capacity))
+        self._starts = array(time_type, bytes(8 * capacity))
+        self._ends = array(time_type, bytes(8 * capacity))
+
+    @classmethod
+    def from_notes(cls, notes, capacity=DEFAULT_CAPACITY, resolution=None):
+        """
+        :param notes: Iterable of (pitch, start, end, velocity)
+        :param capacity: (int) Initial capacity
+        :param resolution: (int) Ticks per quarter note of integer tick times, or None for seconds
+        :return: (NoteBuffer) Buffer holding the notes
+        """
+        buffer = cls(capacity, resolution)
+        buffer.extend(notes)
+        return buffer
+
+    @classmethod
+    def from_columns(cls, pitches, starts, ends, velocities, resolution=None):
+        """
+        Build a buffer from whole columns in one copy each, e.g. numpy arrays.
+
+        :param pitches: Bytes-like column of uint8 pitches
+        :param starts: Bytes-like column of float64 start times (int64 ticks with a resolution)
+        :param ends: Bytes-like column of float64 end times (int64 ticks with a resolution)
+        :param velocities: Bytes-like column of uint8 velocities
+        :param resolution: (int) Ticks per quarter note of integer tick times, or None for seconds
+        :return: (NoteBuffer) Buffer holding the notes
+        """
+        buffer = cls(resolution=resolution)
+        for column, values in ((buffer._pitches, pitches), (buffer._starts, starts),
+                               (buffer._ends, ends), (buffer._velocities, velocities)):
+            del column[:]
+            column.frombytes(memoryview(values).cast("B"))
+        lengths = {len(buffer._pitches), len(buffer._starts), len(buffer._ends), len(buffer._velocities)}
+        if len(lengths) != 1:
+            raise ValueError("Columns differ in length")
+        buffer._length = lengths.pop()
+        if buffer._length == 0:
+            return cls(resolution=resolution)
+        return buffer
+
+    @property
+    def capacity(self):
+        return len(self._pitches)
+
+    def _grow(self):
+        capacity = self.capacity
+        self._pitches.frombytes(bytes(capacity))
+        self._velocities.frombytes(bytes(capacity))
+        self._starts.frombytes(bytes(8 * capacity))
+        self._ends.frombytes(bytes(8 * capacity))
+
+    def append(self, pitch, start, end, velocity):
+        i = self._length
+        if i == len(self._pitches):
+            self._grow()
+        self._pitches[i] = pitch
+        self._starts[i] = start
+        self._ends[i] = end
+        self._velocities[i] = velocity
+        self._length = i + 1
+
+    def extend(self, notes):
+        """
+        :param notes: Iterable of (pitch, start, end, velocity)
+        """
+        append = self.append
+        for pitch, start, end, velocity in notes:
+            append(pitch, start, end, velocity)
+
+    def clear(self):
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError("note index out of range")
+        return (self._pitches[i], self._starts[i], self._ends[i], self._velocities[i])
+
+    def __iter__(self):
+        return zip(
+            self._pitches[:self._length],
+            self._starts[:self._length],
+            self._ends[:self._length],
+            self._velocities[:self._length],
+        )
+
+    def columns(self):
+        """
+        The filled part of every column, without copying; numpy.asarray
+        turns each into an array.
+
+        :return: (tuple) memoryviews (pitches, starts, ends, velocities)
+        """
+        n = self._length
+        return (
+            memoryview(self._pitches)[:n],
+            memoryview(self._starts)[:n],
+            memoryview(self._ends)[:n],
+            memoryview(self._velocities)[:n],
+        )
+
+    def to_seconds(self, tempo=120):
+        """
+        The notes with times in seconds. Tick times are each multiplied out
+        from their integer tick, so there is no drift however long the buffer.
+
+        :param tempo: (int) Tempo in BPM
+        :return: (NoteBuffer) This buffer if it already holds seconds, else a new one
+        """
+        if self.resolution is None:
+            return self
+
+        # computed like midi_writer.tick_scale, so the ticks round-trip exactly
+        seconds_per_tick = 60.0 / (tempo * self.resolution)
+        n = self._length
+        buffer = NoteBuffer(n)
+        buffer._pitches[:n] = self._pitches[:n]
+        buffer._velocities[:n] = self._velocities[:n]
+        buffer._starts[:n] = array("d", [tick * seconds_per_tick for tick in self._starts[:n]])
+        buffer._ends[:n] = array("d", [tick * seconds_per_tick for tick in self._ends[:n]])
+        buffer._length = n
+        return buffer
+
+    def to_pretty_midi(self, tempo=120, instrument_program=0):
+        """
+        Build a pretty_midi object holding the notes as one instrument.
+
+        :param tempo: (int) Tempo in BPM
+        :param instrument_program: (int) MIDI program number (instrument)
+        :return: (pretty_midi.PrettyMIDI) The MIDI data
+        """
+        # pretty_midi pulls in numpy and mido, so only import it when it is used
+        import pretty_midi
+
+        pm = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+        instrument = pretty_midi.Instrument(program=instrument_program)
+        instrument.notes = [
+            pretty_midi.Note(velocity=velocity, pitch=pitch, start=start, end=end)
+            for pitch, start, end, velocity in self.to_seconds(tempo)
+        ]
+        pm.instruments.append(instrument)
+        return pm
@@ -0,0 +1,214 @@
+# output_cache.py
+# version 0.1
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import music_generator
+from scale_library import ScaleLibrary
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dynamic_music_generator")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+CACHE_SUFFIX = ".mid"
+
+# Generation modes whose output only depends on the parameters (the others
+# need a seed to be repeatable)
+DETERMINISTIC_MODES = {"Scale"}
+
+
+def normalize_params(params):
+    """
+    Canonical form of generation parameters, so equivalent requests share a key.
+
+    Key names are reduced to their canonical spelling ('C# Minor' and
+    'Db Natural Minor' are the same key), numbers to int or float, and
+    parameters that do not change the output (the filename, and a
+    composition already made from the other parameters) are dropped.
+
+    :param params: (dict) mode, key_name, tempo, instrument_program,
+                   note_length_fraction, note_count, seed, ...
+    :return: (dict) Normalized parameters
+    """
+    normalized = {}
+    for name, value in params.items():
+        if name in ("filename", "composition") or value is None:
+            continue
+        if name == "key_name":
+            value = " ".join(ScaleLibrary.parse_key_name(value))
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        normalized[name] = value
+
+    if normalized.get("mode") in DETERMINISTIC_MODES:
+        normalized.pop("seed", None)
+        normalized.pop("note_count", None)
+    return normalized
+
+
+def is_cacheable(params):
+    """
+    :param params: (dict) Generation parameters
+    :return: (bool) True when the parameters fully determine the output
+    """
+    return params.get("mode") in DETERMINISTIC_MODES or params.get("seed") is not None
+
+
+def cache_key(params):
+    """
+    :param params: (dict) Generation parameters
+    :return: (str) sha256 hex digest of the normalized parameters and generator version
+    """
+    payload = json.dumps(
+        {"version": music_generator.GENERATOR_VERSION, "params": normalize_params(params)},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class OutputCache:
+    """
+    Content-addressed on-disk cache of generated MIDI files.
+
+    Entries live in sharded folders (the first two hex digits of the key)
+    and are written to a temporary file then renamed into place, so readers
+    never see partial files, also across processes. The total size is
+    capped; the least recently used entries (oldest modification time,
+    refreshed on every hit) are evicted first.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param directory: (str) Cache folder (created if missing)
+        :param max_bytes: (int) Size cap of all entries together
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.current_bytes = sum(os.path.getsize(path) for path, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + CACHE_SUFFIX)
+
+    def _entries(self):
+        """
+        :return: generator of (path, os.stat_result) of every entry
+        """
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(CACHE_SUFFIX):
+                    try:
+                        yield entry.path, entry.stat()
+                    except FileNotFoundError:
+                        pass    # evicted by another process
+
+    def get(self, key):
+        """
+        :param key: (str) Key from cache_key()
+        :return: (bytes) Cached MIDI data, or None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """
+        Store MIDI data under key, then evict entries over the size cap.
+
+        :param key: (str) Key from cache_key()
+        :param data: (bytes) MIDI data
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self.current_bytes += len(data) - replaced
+            if self.current_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        self.current_bytes = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if self.current_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.current_bytes -= stat.st_size
+
+    def get_or_generate(self, params, generate):
+        """
+        Return the cached output for params, generating and storing it on a miss.
+
+        :param params: (dict) Generation parameters
+        :param generate: Function returning the MIDI bytes for params
+        :return: (bytes) MIDI data
+        """
+        if not is_cacheable(params):
+            return generate()
+
+        key = cache_key(params)
+        data = self.get(key)
+        if data is None:
+            data = generate()
+            self.put(key, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            for path, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        :return: (dict) hits, misses, hit_rate, bytes and max_bytes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -1,51 +1,220 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+# One precomputed scale: the sorted notes plus reverse lookups from MIDI pitch
+# to scale degree (0 = tonic) and to the first index of that pitch in notes.
+ScaleTable = namedtuple("ScaleTable", ["notes", "degrees", "indices"])
+
+
 class ScaleLibrary:
     """
     Provides multi-octave scales for different keys.
+
+    A key name is a root and a mode, e.g. 'C Major', 'F# Dorian' or
+    'Bb Harmonic Minor'. Tables are built once, never modified afterwards and
+    can be shared freely between threads.
     """
 
-    KEY_ROOT_NOTES_MAJOR = {
-        'C Major': 60,
-        'D Major': 62,
-        'E Major': 64,
-        'F Major': 65,
-        'G Major': 67,
-        'A Major': 69,
-        'B Major': 71,
-        'Bb Major': 70,
-        'Eb Major': 63
+    ROOT_NOTES = {
+        'C': 60,
+        'Db': 61,
+        'D': 62,
+        'Eb': 63,
+        'E': 64,
+        'F': 65,
+        'F#': 66,
+        'G': 67,
+        'Ab': 68,
+        'A': 69,
+        'Bb': 70,
+        'B': 71
+    }
+
+    ROOT_ALIASES = {
+        'C#': 'Db',
+        'D#': 'Eb',
+        'Gb': 'F#',
+        'G#': 'Ab',
+        'A#': 'Bb'
+    }
+
+    MAJOR_SCALE_STEPS = (0, 2, 4, 5, 7, 9, 11, 12)
+
+    MODE_STEPS = {
+        'Major': MAJOR_SCALE_STEPS,
+        'Natural Minor': (0, 2, 3, 5, 7, 8, 10, 12),
+        'Harmonic Minor': (0, 2, 3, 5, 7, 8, 11, 12),
+        'Melodic Minor': (0, 2, 3, 5, 7, 9, 11, 12),
+        'Ionian': (0, 2, 4, 5, 7, 9, 11, 12),
+        'Dorian': (0, 2, 3, 5, 7, 9, 10, 12),
+        'Phrygian': (0, 1, 3, 5, 7, 8, 10, 12),
+        'Lydian': (0, 2, 4, 6, 7, 9, 11, 12),
+        'Mixolydian': (0, 2, 4, 5, 7, 9, 10, 12),
+        'Aeolian': (0, 2, 3, 5, 7, 8, 10, 12),
+        'Locrian': (0, 1, 3, 5, 6, 8, 10, 12),
+        'Major Pentatonic': (0, 2, 4, 7, 9, 12),
+        'Minor Pentatonic': (0, 3, 5, 7, 10, 12)
+    }
+
+    MODE_ALIASES = {
+        'Minor': 'Natural Minor'
     }
 
-    MAJOR_SCALE_STEPS = [0, 2, 4, 5, 7, 9, 11, 12]
+    DEFAULT_OCTAVES = (48, 60, 72)
 
-    _major_scales_cache = None
+    # (root, mode, octaves) -> ScaleTable
+    _scale_cache = {}
+    # octaves -> read-only {key name: notes} of every major key
+    _major_scales_cache = {}
+    _cache_lock = threading.Lock()
 
     @classmethod
-    def _generate_scale_for_key(cls, root_note, octaves=[48, 60, 72]):
+    def _generate_scale_for_key(cls, root_note, octaves=DEFAULT_OCTAVES, steps=MAJOR_SCALE_STEPS):
         """
-        Generate a multi-octave major scale starting from the given root note.
+        Generate a multi-octave scale starting from the given root note.
 
         :param root_note: MIDI note number for the key's tonic (e.g. 60 for C)
         :param octaves: List of base notes for octaves
+        :param steps: Semitone offsets of the scale degrees from the tonic
         :return: List of MIDI note number in the scale
         """
         full_scale = []
         for base in octaves:
-            for step in cls.MAJOR_SCALE_STEPS:
+            for step in steps:
                 note = base + (root_note - 60) + step
                 full_scale.append(note)
         return sorted(full_scale)
 
     @classmethod
-    def major_scales(cls, octaves=[48, 60, 72]):
+    def parse_key_name(cls, key_name):
+        """
+        Split a key name into its canonical root and mode.
+
+        :param key_name: (str) Key name such as 'C# Minor'
+        :return: (tuple) (root, mode), e.g. ('Db', 'Natural Minor')
+        """
+        root, _, mode = key_name.strip().partition(' ')
+        root = cls.ROOT_ALIASES.get(root, root)
+        mode = cls.MODE_ALIASES.get(mode, mode)
+        if root not in cls.ROOT_NOTES or mode not in cls.MODE_STEPS:
+            raise KeyError(key_name)
+        return root, mode
+
+    @classmethod
+    def key_names(cls, mode=None):
+        """
+        Canonical names of every key, optionally only for one mode.
+
+        :param mode: (str) Mode name such as 'Major' or 'Dorian'
+        :return: (list) Key names
+        """
+        modes = cls.MODE_STEPS if mode is None else [cls.MODE_ALIASES.get(mode, mode)]
+        return [f"{root} {m}" for m in modes for root in cls.ROOT_NOTES]
+
+    @classmethod
+    def _build_table(cls, root, mode, octaves):
+        root_note = cls.ROOT_NOTES[root]
+        notes = tuple(cls._generate_scale_for_key(root_note, octaves, cls.MODE_STEPS[mode]))
+
+        degree_count = len(cls.MODE_STEPS[mode]) - 1
+        degree_of_pitch_class = {
+            (root_note + step) % 12: degree
+            for degree, step in enumerate(cls.MODE_STEPS[mode][:degree_count])
+        }
+
+        degrees = {}
+        indices = {}
+        for index, note in enumerate(notes):
+            degrees[note] = degree_of_pitch_class[note % 12]
+            indices.setdefault(note, index)
+
+        return ScaleTable(notes, MappingProxyType(degrees), MappingProxyType(indices))
+
+    @classmethod
+    def _build_default_index(cls):
+        """
+        Precompute every root and mode over the default octaves.
+        """
+        for root in cls.ROOT_NOTES:
+            for mode in cls.MODE_STEPS:
+                cache_key = (root, mode, cls.DEFAULT_OCTAVES)
+                cls._scale_cache[cache_key] = cls._build_table(root, mode, cls.DEFAULT_OCTAVES)
+
+    @classmethod
+    def scale_table(cls, key_name, octaves=DEFAULT_OCTAVES):
+        """
+        Returns the precomputed table for a key over the given octaves.
+
+        :param key_name: (str) Key name such as 'D Dorian'
+        :param octaves: List of base notes for octaves
+        :return: (ScaleTable) notes, pitch -> degree and pitch -> index lookups
+        """
+        root, mode = cls.parse_key_name(key_name)
+        cache_key = (root, mode, tuple(octaves))
+
+        table = cls._scale_cache.get(cache_key)
+        if table is None:
+            with cls._cache_lock:
+                if not cls._scale_cache:
+                    cls._build_default_index()
+                table = cls._scale_cache.get(cache_key)
+                if table is None:
+                    table = cls._build_table(root, mode, cache_key[2])
+                    cls._scale_cache[cache_key] = table
+        return table
+
+    @classmethod
+    def scale(cls, key_name, octaves=DEFAULT_OCTAVES):
+        """
+        Returns the notes of a key over multiple octaves.
+
+        :param key_name: (str) Key name such as 'A Natural Minor'
+        :param octaves: List of base notes for octaves
+        :return: (tuple) MIDI note numbers in ascending order
+        """
+        return cls.scale_table(key_name, octaves).notes
+
+    @classmethod
+    def degree_of(cls, key_name, pitch, octaves=DEFAULT_OCTAVES):
+        """
+        Scale degree of a MIDI pitch in a key (0 = tonic), or None if the
+        pitch is not in the scale.
+
+        :param key_name: (str) Key name
+        :param pitch: (int) MIDI note number
+        :param octaves: List of base notes for octaves
+        :return: (int) Scale degree or None
+        """
+        return cls.scale_table(key_name, octaves).degrees.get(pitch)
+
+    @classmethod
+    def index_of(cls, key_name, pitch, octaves=DEFAULT_OCTAVES):
+        """
+        Position of a MIDI pitch in the scale returned by scale(), or None.
+
+        :param key_name: (str) Key name
+        :param pitch: (int) MIDI note number
+        :param octaves: List of base notes for octaves
+        :return: (int) Index or None
+        """
+        return cls.scale_table(key_name, octaves).indices.get(pitch)
+
+    @classmethod
+    def major_scales(cls, octaves=DEFAULT_OCTAVES):
         """
         Returns a dictionary of major scales for all keys over multiple octaves.
-        Lazily initializes only once
+        Built once per octave range.
         :param octaves: List of base notes for octaves
-        :return: Dictionary of major scales
-        """
-        if cls._major_scales_cache is None:
-            major_scales = {}
-            for key_name, root_note in cls.KEY_ROOT_NOTES_MAJOR.items():
-                major_scales[key_name] = cls._generate_scale_for_key(root_note, octaves)
-            cls._major_scales_cache = major_scales
-        return cls._major_scales_cache
\ No newline at end of file
+        :return: Read-only dictionary of major scales
+        """
+        octaves = tuple(octaves)
+        scales = cls._major_scales_cache.get(octaves)
+        if scales is None:
+            scales = MappingProxyType({
+                key_name: cls.scale(key_name, octaves)
+                for key_name in cls.key_names('Major')
+            })
+            with cls._cache_lock:
+                scales = cls._major_scales_cache.setdefault(octaves, scales)
+        return scales
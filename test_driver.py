@@ -1,5 +1,4 @@
 import music_generator
-from music_generator import KEY_SCALES_MAJOR
 from scale_library import ScaleLibrary
 
 